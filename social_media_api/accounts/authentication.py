@@ -0,0 +1,187 @@
+# social_media_api/accounts/authentication.py
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from .models import AuthToken
+
+
+class LocalLRUCache:
+    """Small thread-safe in-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+local_token_cache = LocalLRUCache(settings.TOKEN_AUTH_LOCAL_MAXSIZE,
+                                  settings.TOKEN_AUTH_LOCAL_TTL)
+
+
+# Revoked keys are remembered for a full token lifetime so a revoked token is
+# rejected from memory instead of costing a database miss on every retry
+local_revocations = LocalLRUCache(settings.TOKEN_AUTH_LOCAL_MAXSIZE,
+                                  settings.AUTH_TOKEN_TTL.total_seconds())
+
+
+def _cache_key(token_key):
+    # Never put raw credentials into shared cache keys
+    return 'auth:token:' + hashlib.sha256(token_key.encode()).hexdigest()
+
+
+def _revocation_key(cache_key):
+    return cache_key.replace('auth:token:', 'auth:revoked:', 1)
+
+
+def invalidate_token(token_key):
+    cache_key = _cache_key(token_key)
+    local_token_cache.delete(cache_key)
+    cache.delete(cache_key)
+
+
+def revoke_token(token_key):
+    """Drop any cached copy of the token and mark it revoked everywhere."""
+    cache_key = _cache_key(token_key)
+    revocation_key = _revocation_key(cache_key)
+    local_token_cache.delete(cache_key)
+    local_revocations.set(revocation_key, True)
+    cache.delete(cache_key)
+    cache.set(revocation_key, True, int(settings.AUTH_TOKEN_TTL.total_seconds()))
+
+
+class CachedUser(SimpleLazyObject):
+    """
+    User authenticated from a cached token entry. The pk and is_active come
+    from the entry; the user row is only read, fresh, the first time
+    anything else is used.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_id, is_active):
+        User = get_user_model()
+        super().__init__(lambda: User._default_manager.get(pk=user_id))
+        # Set on the proxy itself so reading them does not load the user
+        self.__dict__.update(pk=user_id, id=user_id, is_active=is_active)
+
+    def __bool__(self):
+        return True
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that memoizes token lookups, first in a per-process
+    LRU (TOKEN_AUTH_LOCAL_TTL) and then in the shared Django cache
+    (TOKEN_AUTH_CACHE_TTL), so most authenticated requests skip the
+    Token/CustomUser query. Entries hold only the user id, is_active, the
+    token key and its expiry, never user data or password hashes; the user
+    is loaded lazily (see CachedUser). Entries are invalidated by the
+    signals in accounts.signals on logout and deactivation; other processes
+    may keep a local entry for at most TOKEN_AUTH_LOCAL_TTL.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key = _cache_key(key)
+        cached = local_token_cache.get(cache_key)
+        if cached is None:
+            cached = self.get_shared(cache_key)
+            if cached is not None:
+                local_token_cache.set(cache_key, cached)
+        if cached is not None:
+            user_id, is_active, token_key, expires_at = cached
+            if is_active:
+                token = self.get_model()(key=token_key, user_id=user_id)
+                if expires_at is not None:
+                    token.expires_at = expires_at
+                return self.check_token(cache_key, CachedUser(user_id, is_active), token)
+
+        user, token = super().authenticate_credentials(key)
+        self.remember(cache_key, user, token)
+        return self.check_token(cache_key, user, token)
+
+    def get_shared(self, cache_key):
+        return cache.get(cache_key)
+
+    def remember(self, cache_key, user, token):
+        entry = (user.pk, user.is_active, token.key, getattr(token, 'expires_at', None))
+        local_token_cache.set(cache_key, entry)
+        cache.set(cache_key, entry, settings.TOKEN_AUTH_CACHE_TTL)
+
+    def check_token(self, cache_key, user, token):
+        """Hook for subclasses to validate a (possibly cached) token."""
+        return user, token
+
+
+class ExpiringTokenAuthentication(CachedTokenAuthentication):
+    """
+    CachedTokenAuthentication for per-device AuthTokens with a sliding
+    expiry. Revoked keys are checked in memory before any lookup, and the
+    shared revocation marker is fetched in the same cache round trip as the
+    token itself. Using a token pushes its expiry forward at most once per
+    AUTH_TOKEN_REFRESH_INTERVAL, so an active client writes once a day rather
+    than once a request.
+    """
+
+    model = AuthToken
+
+    def authenticate_credentials(self, key):
+        if local_revocations.get(_revocation_key(_cache_key(key))):
+            raise AuthenticationFailed('Invalid token.')
+        return super().authenticate_credentials(key)
+
+    def get_shared(self, cache_key):
+        revocation_key = _revocation_key(cache_key)
+        found = cache.get_many([cache_key, revocation_key])
+        if found.get(revocation_key):
+            local_revocations.set(revocation_key, True)
+            raise AuthenticationFailed('Invalid token.')
+        return found.get(cache_key)
+
+    def check_token(self, cache_key, user, token):
+        now = timezone.now()
+        if token.expires_at <= now:
+            raise AuthenticationFailed('Token has expired.')
+        refresh_before = now + settings.AUTH_TOKEN_TTL - settings.AUTH_TOKEN_REFRESH_INTERVAL
+        if token.expires_at < refresh_before:
+            token.expires_at = now + settings.AUTH_TOKEN_TTL
+            AuthToken.objects.filter(pk=token.pk).update(expires_at=token.expires_at)
+            self.remember(cache_key, user, token)
+        return user, token
@@ -0,0 +1,96 @@
+# social_media_api/accounts/hashing.py
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.contrib.auth.signals import user_login_failed
+from django.contrib.auth.hashers import check_password, make_password
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when every slot of the password-check pool is taken."""
+
+
+class PasswordCheckPool:
+    """
+    Bounded thread pool for password verification. Only the hash runs in the
+    pool (no database access), and at most LOGIN_HASH_WORKERS hashes run at
+    once per process, with up to LOGIN_HASH_QUEUE_SIZE more waiting; beyond
+    that `check` fails fast with PasswordCheckBusy instead of queueing.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._config = None
+        self._executor = None
+        self._slots = None
+
+    def _ensure_pool(self):
+        config = (settings.LOGIN_HASH_WORKERS, settings.LOGIN_HASH_QUEUE_SIZE)
+        with self._lock:
+            if config != self._config:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False)
+                workers, queue_size = config
+                self._executor = ThreadPoolExecutor(
+                    max_workers=workers, thread_name_prefix='password-check')
+                self._slots = threading.BoundedSemaphore(workers + queue_size)
+                self._config = config
+            return self._executor, self._slots
+
+    def check(self, password, encoded):
+        """
+        Return (valid, upgraded_hash). `encoded` is None for unknown users;
+        a hash is still computed so response times do not reveal which
+        usernames exist. `upgraded_hash` is set when the stored hash uses
+        outdated parameters and should be replaced.
+        """
+        executor, slots = self._ensure_pool()
+        if not slots.acquire(blocking=False):
+            raise PasswordCheckBusy
+        try:
+            return executor.submit(_check, password, encoded).result()
+        finally:
+            slots.release()
+
+
+def _check(password, encoded):
+    if encoded is None:
+        make_password(password)
+        return False, None
+    upgraded = []
+    valid = check_password(password, encoded,
+                           setter=lambda raw: upgraded.append(make_password(raw)))
+    return valid, upgraded[0] if upgraded else None
+
+
+password_checks = PasswordCheckPool()
+
+
+def authenticate_login(request, username, password):
+    """
+    Verify login credentials, returning the user or None. Hashes inline via
+    authenticate() unless LOGIN_HASH_WORKERS is set, in which case the user
+    is fetched here and only the hash is handed to the bounded pool. That
+    path checks credentials the way ModelBackend does and bypasses any other
+    AUTHENTICATION_BACKENDS, but still sends user_login_failed.
+    """
+    if not settings.LOGIN_HASH_WORKERS:
+        return authenticate(request, username=username, password=password)
+
+    User = get_user_model()
+    try:
+        user = User._default_manager.get_by_natural_key(username)
+    except User.DoesNotExist:
+        user = None
+    valid, upgraded = password_checks.check(password,
+                                            user.password if user else None)
+    if not valid or not user.is_active:
+        user_login_failed.send(sender=__name__, request=request, credentials={
+            'username': username, 'password': '********************'})
+        return None
+    if upgraded:
+        user.password = upgraded
+        user.save(update_fields=['password'])
+    return user
@@ -0,0 +1,177 @@
+# social_media_api/accounts/images.py
+
+import atexit
+import hashlib
+import logging
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from io import BytesIO
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+ALLOWED_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+
+ProfilePictureJob = namedtuple('ProfilePictureJob', ['user_id', 'staged_path'])
+
+
+def validate_profile_picture(upload):
+    """
+    Reject uploads that are too large, not a supported image format or so
+    big in pixels that decoding them would be expensive. Only the image
+    header is read here; decoding happens in the background worker.
+    """
+    if upload.size > settings.PROFILE_PICTURE_MAX_UPLOAD_SIZE:
+        raise ValidationError('Profile pictures must be at most '
+                              f'{settings.PROFILE_PICTURE_MAX_UPLOAD_SIZE // (1024 * 1024)} MB.')
+    upload.seek(0)
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError('Upload a valid image.')
+    finally:
+        upload.seek(0)
+    if image_format not in ALLOWED_FORMATS:
+        raise ValidationError('Profile pictures must be JPEG, PNG, GIF or WebP images.')
+    if width * height > settings.PROFILE_PICTURE_MAX_PIXELS:
+        raise ValidationError('Profile picture dimensions are too large.')
+
+
+def _encode(image):
+    # Re-encoding without passing exif/icc data strips all metadata
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=settings.PROFILE_PICTURE_QUALITY,
+               optimize=True)
+    return buffer.getvalue()
+
+
+def _store(storage, name, image):
+    # Names are derived from the upload's content, so an existing file
+    # already holds exactly these bytes
+    if not storage.exists(name):
+        storage.save(name, ContentFile(_encode(image)))
+    return name
+
+
+def process_profile_picture(user_id, staged_path):
+    """
+    Turn a staged upload into a metadata-free, bounded main image plus one
+    square thumbnail per PROFILE_PICTURE_SIZES entry, store them under
+    content-hashed names and point the user at them.
+    """
+    try:
+        with open(staged_path, 'rb') as handle:
+            data = handle.read()
+        digest = hashlib.sha256(data).hexdigest()[:20]
+        storage = User._meta.get_field('profile_picture').storage
+
+        with Image.open(BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode in ('RGBA', 'LA', 'P'):
+                image = image.convert('RGBA')
+                background = Image.new('RGB', image.size, 'white')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            else:
+                image = image.convert('RGB')
+
+            sizes = {}
+            for name, size in settings.PROFILE_PICTURE_SIZES.items():
+                thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+                sizes[name] = _store(storage, f'profile_pics/{digest}_{size}.jpg',
+                                     thumbnail)
+            limit = settings.PROFILE_PICTURE_MAX_DIMENSION
+            image.thumbnail((limit, limit), Image.LANCZOS)
+            main = _store(storage, f'profile_pics/{digest}.jpg', image)
+
+        # update() keeps the write to two columns; files are shared between
+        # users who upload identical images, so old ones are not deleted
+        User.objects.filter(pk=user_id).update(profile_picture=main,
+                                               profile_picture_sizes=sizes)
+    finally:
+        try:
+            os.remove(staged_path)
+        except FileNotFoundError:
+            pass
+
+
+class ProfilePictureProcessor:
+    """
+    Runs process_profile_picture on a daemon worker thread so requests only
+    pay for writing the upload to local disk. With PROFILE_PICTURES_ASYNC
+    disabled (e.g. in tests) jobs run inline.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, job):
+        if not settings.PROFILE_PICTURES_ASYNC:
+            process_profile_picture(*job)
+            return
+        self._ensure_worker()
+        self.queue.put(job)
+
+    def flush(self, timeout=None):
+        """Wait until every queued job has been processed (or `timeout`)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks and self._worker and self._worker.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+
+    def _ensure_worker(self):
+        # Started lazily so each forked server process gets its own worker
+        if self._worker and self._worker.is_alive():
+            return
+        with self._lock:
+            if not (self._worker and self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, daemon=True,
+                                                name='profile-picture-processor')
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            try:
+                close_old_connections()
+                process_profile_picture(*job)
+            except Exception:
+                logger.exception('Failed to process profile picture for user %s',
+                                 job.user_id)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+
+processor = ProfilePictureProcessor()
+atexit.register(processor.flush, timeout=5)
+
+
+def schedule_profile_picture(user, upload):
+    """
+    Stage `upload` on local disk and process it once the current transaction
+    commits, replacing the user's profile picture and thumbnails.
+    """
+    staging_dir = settings.PROFILE_PICTURE_STAGING_DIR
+    os.makedirs(staging_dir, exist_ok=True)
+    descriptor, staged_path = tempfile.mkstemp(dir=staging_dir, suffix='.upload')
+    with os.fdopen(descriptor, 'wb') as handle:
+        for chunk in upload.chunks():
+            handle.write(chunk)
+    job = ProfilePictureJob(user_id=user.pk, staged_path=staged_path)
+    transaction.on_commit(lambda: processor.enqueue(job))
@@ -0,0 +1,95 @@
+# social_media_api/accounts/management/commands/compute_follow_suggestions.py
+
+import heapq
+import time
+from array import array
+from collections import Counter
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import Follow, FollowSuggestion
+
+EDGE_CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Precompute friends-of-friends "who to follow" suggestions for '
+            'every user from an in-memory copy of the follow graph.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int,
+                            default=settings.FOLLOW_SUGGESTIONS_TOP_K,
+                            help='Suggestions stored per user.')
+        parser.add_argument('--max-neighbors', type=int, default=1000,
+                            help='Followees expanded per hop, bounding work '
+                                 'for users who follow very many accounts.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Users whose suggestions are written per transaction.')
+
+    def load_adjacency(self):
+        """Follower id -> compact array of followee ids, newest first."""
+        adjacency = {}
+        edges = (Follow.objects.order_by('follower_id', '-created_at')
+                 .values_list('follower_id', 'followee_id'))
+        for follower_id, followee_id in edges.iterator(chunk_size=EDGE_CHUNK_SIZE):
+            adjacency.setdefault(follower_id, array('q')).append(followee_id)
+        return adjacency
+
+    def suggest(self, user_id, adjacency, top_k, max_neighbors):
+        following = adjacency[user_id]
+        excluded = set(following)
+        excluded.add(user_id)
+        scores = Counter()
+        for followee_id in following[:max_neighbors]:
+            for candidate_id in adjacency.get(followee_id, ())[:max_neighbors]:
+                if candidate_id not in excluded:
+                    scores[candidate_id] += 1
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def write_batch(self, suggestions):
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=suggestions).delete()
+            FollowSuggestion.objects.bulk_create([
+                FollowSuggestion(user_id=user_id, candidate_id=candidate_id,
+                                 score=score)
+                for user_id, candidates in suggestions.items()
+                for candidate_id, score in candidates
+            ])
+
+    def delete_stale(self, run_started, batch_size):
+        """
+        Delete suggestions this run did not rewrite, e.g. those of users who
+        no longer follow anyone, in batches. Returns the number deleted.
+        """
+        deleted = 0
+        stale = FollowSuggestion.objects.filter(computed_at__lt=run_started)
+        while True:
+            ids = list(stale.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += FollowSuggestion.objects.filter(pk__in=ids).delete()[0]
+
+    def handle(self, *args, **options):
+        run_started = timezone.now()
+        started = time.monotonic()
+        adjacency = self.load_adjacency()
+        self.stdout.write(f'Loaded follow graph for {len(adjacency)} users '
+                          f'in {time.monotonic() - started:.1f}s.')
+
+        batch, written = {}, 0
+        for user_id in adjacency:
+            batch[user_id] = self.suggest(user_id, adjacency, options['top_k'],
+                                          options['max_neighbors'])
+            if len(batch) >= options['batch_size']:
+                self.write_batch(batch)
+                written += len(batch)
+                batch = {}
+        if batch:
+            self.write_batch(batch)
+            written += len(batch)
+        stale = self.delete_stale(run_started, options['batch_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Computed suggestions for {written} users and deleted {stale} '
+            f'stale ones in {time.monotonic() - started:.1f}s.'))
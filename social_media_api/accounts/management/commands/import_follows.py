@@ -0,0 +1,89 @@
+# social_media_api/accounts/management/commands/import_follows.py
+
+import csv
+import json
+import time
+from itertools import islice
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import Follow, recount_follow_counters
+
+User = get_user_model()
+
+COUNTER_BATCH_SIZE = 1000
+
+
+def read_csv(path):
+    with open(path, newline='') as handle:
+        for row in csv.DictReader(handle):
+            yield row['follower'], row['followee']
+
+
+def read_json(path):
+    with open(path) as handle:
+        for edge in json.load(handle):
+            if isinstance(edge, dict):
+                yield edge['follower'], edge['followee']
+            else:
+                yield edge[0], edge[1]
+
+
+class Command(BaseCommand):
+    help = ('Import a follow graph from a CSV file (with follower,followee '
+            'columns) or a JSON list of {"follower", "followee"} objects or '
+            'pairs. Existing edges are skipped; counters are recomputed for '
+            'every user touched. Timelines are not backfilled: run '
+            'rebuild_timelines afterwards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON file to import.')
+        parser.add_argument('--format', choices=['csv', 'json'],
+                            help='Input format (default: from file extension).')
+        parser.add_argument('--key', choices=['username', 'id'], default='username',
+                            help='How users are identified in the file.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Edges resolved and inserted per batch.')
+
+    def resolve(self, key, identifiers):
+        """Map file identifiers to user ids with a single query."""
+        if key == 'id':
+            identifiers = {int(identifier) for identifier in identifiers}
+        users = User.objects.filter(**{f'{key}__in': identifiers})
+        return {str(identifier): pk
+                for identifier, pk in users.values_list(key, 'pk')}
+
+    def handle(self, *args, **options):
+        path = options['path']
+        input_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if input_format not in ('csv', 'json'):
+            raise CommandError('Cannot tell the input format; pass --format.')
+        edges = read_csv(path) if input_format == 'csv' else read_json(path)
+
+        started = time.monotonic()
+        read = skipped = 0
+        touched = set()
+        while True:
+            batch = [(str(follower), str(followee)) for follower, followee
+                     in islice(edges, options['batch_size'])]
+            if not batch:
+                break
+            read += len(batch)
+            ids = self.resolve(options['key'],
+                               {identifier for edge in batch for identifier in edge})
+            follows = []
+            for follower, followee in batch:
+                follower_id, followee_id = ids.get(follower), ids.get(followee)
+                if follower_id is None or followee_id is None or follower_id == followee_id:
+                    skipped += 1
+                    continue
+                follows.append(Follow(follower_id=follower_id, followee_id=followee_id))
+                touched.update((follower_id, followee_id))
+            Follow.objects.bulk_create(follows, ignore_conflicts=True)
+
+        touched = sorted(touched)
+        for start in range(0, len(touched), COUNTER_BATCH_SIZE):
+            recount_follow_counters(touched[start:start + COUNTER_BATCH_SIZE])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {read - skipped} of {read} edges '
+            f'({skipped} skipped) in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,83 @@
+# social_media_api/accounts/management/commands/provision_users.py
+
+import csv
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from accounts.models import AuthToken
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Bulk-create numbered users (e.g. loadtest00001) for seeding '
+            'load-test environments. All accounts share one password, hashed '
+            'once; optionally issues a token per user and writes them to CSV. '
+            'Existing usernames are skipped. Not for production accounts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('count', type=int, help='Number of users to create.')
+        parser.add_argument('--prefix', default='loadtest',
+                            help='Username prefix.')
+        parser.add_argument('--start', type=int, default=1,
+                            help='First number appended to the prefix.')
+        parser.add_argument('--password', default='loadtest-password',
+                            help='Password shared by every provisioned user.')
+        parser.add_argument('--tokens', metavar='PATH',
+                            help='Issue a token per user and write username,token rows here.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Users inserted per transaction.')
+
+    def create_batch(self, usernames, encoded_password, with_tokens):
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=username, password=encoded_password)
+                 for username in usernames],
+                ignore_conflicts=True)
+            if not with_tokens:
+                return []
+            # bulk_create does not return primary keys on MySQL; look them up
+            user_ids = list(User.objects.filter(username__in=usernames)
+                            .values_list('username', 'pk'))
+            # Re-running rotates the tokens of users provisioned earlier
+            AuthToken.objects.filter(user_id__in=[pk for _, pk in user_ids],
+                                     device='provisioned').delete()
+            expires_at = timezone.now() + settings.AUTH_TOKEN_TTL
+            tokens = [AuthToken(key=AuthToken.generate_key(), user_id=pk,
+                                device='provisioned', expires_at=expires_at)
+                      for _, pk in user_ids]
+            AuthToken.objects.bulk_create(tokens)
+            usernames_by_id = {pk: username for username, pk in user_ids}
+            return [(usernames_by_id[token.user_id], token.key) for token in tokens]
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        # Hashing is the expensive part of creating a user; do it once
+        encoded_password = make_password(options['password'])
+        width = len(str(options['start'] + options['count'] - 1))
+        numbers = range(options['start'], options['start'] + options['count'])
+
+        token_file = open(options['tokens'], 'w', newline='') if options['tokens'] else None
+        writer = csv.writer(token_file) if token_file else None
+        try:
+            if writer:
+                writer.writerow(['username', 'token'])
+            for offset in range(0, len(numbers), options['batch_size']):
+                usernames = [f"{options['prefix']}{number:0{width}d}"
+                             for number in numbers[offset:offset + options['batch_size']]]
+                rows = self.create_batch(usernames, encoded_password, writer is not None)
+                if writer:
+                    writer.writerows(rows)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Provisioned {offset + len(usernames)} users')
+        finally:
+            if token_file:
+                token_file.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned {options['count']} users "
+            f'in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,14 @@
+# social_media_api/accounts/management/commands/reconcile_follow_counters.py
+
+from django.contrib.auth import get_user_model
+from accounts.models import FOLLOW_COUNTERS
+from social_media_api.counters import ReconcileCountersCommand
+
+
+class Command(ReconcileCountersCommand):
+    help = ('Recount follow edges per user and repair drifted '
+            'followers_count/following_count, one batch of users at a time.')
+
+    model = get_user_model()
+    counters = FOLLOW_COUNTERS
+    noun = 'users'
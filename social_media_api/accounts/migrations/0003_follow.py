@@ -0,0 +1,67 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def copy_follow_edges(apps, schema_editor):
+    """
+    Merge both legacy join tables into Follow edges. In `following`,
+    from_customuser follows to_customuser; in `followers`, to_customuser
+    is a follower of from_customuser.
+    """
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = apps.get_model('accounts', 'Follow')
+
+    sources = [
+        (CustomUser.following.through, 'from_customuser_id', 'to_customuser_id'),
+        (CustomUser.followers.through, 'to_customuser_id', 'from_customuser_id'),
+    ]
+    for through, follower_field, followee_field in sources:
+        edges = through.objects.order_by('pk').values_list(follower_field,
+                                                           followee_field)
+        batch = []
+        for follower_id, followee_id in edges.iterator(chunk_size=BATCH_SIZE):
+            batch.append(Follow(follower_id=follower_id, followee_id=followee_id))
+            if len(batch) >= BATCH_SIZE:
+                Follow.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_customuser_following'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('followee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_edges', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['follower', '-created_at'], name='follow_follower_created_idx'), models.Index(fields=['followee', '-created_at'], name='follow_followee_created_idx')],
+                'constraints': [models.UniqueConstraint(fields=('follower', 'followee'), name='follow_unique_edge')],
+            },
+        ),
+        migrations.RunPython(copy_follow_edges, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='followers',
+        ),
+        migrations.RemoveField(
+            model_name='customuser',
+            name='following',
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following',
+            field=models.ManyToManyField(related_name='followers', through='accounts.Follow', through_fields=('follower', 'followee'), to=settings.AUTH_USER_MODEL),
+        ),
+    ]
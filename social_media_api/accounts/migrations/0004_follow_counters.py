@@ -0,0 +1,40 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:47
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_follow_counters(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    Follow = apps.get_model('accounts', 'Follow')
+
+    def count_of(field):
+        counts = (Follow.objects.filter(**{field: OuterRef('pk')})
+                  .values(field).annotate(total=Count('pk')).values('total'))
+        return Coalesce(Subquery(counts), 0)
+
+    CustomUser.objects.update(followers_count=count_of('followee'),
+                              following_count=count_of('follower'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_follow'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_follow_counters,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:51
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+
+
+def copy_legacy_tokens(apps, schema_editor):
+    """Carry existing single-per-user tokens over so clients stay logged in."""
+    Token = apps.get_model('authtoken', 'Token')
+    AuthToken = apps.get_model('accounts', 'AuthToken')
+    expires_at = timezone.now() + settings.AUTH_TOKEN_TTL
+    created = Token.objects.filter(key=OuterRef('key')).values('created')
+
+    def copy(batch):
+        AuthToken.objects.bulk_create(batch, ignore_conflicts=True)
+        # created_at is auto_now_add, which overwrites the copied value on
+        # insert; restore the legacy creation times afterwards
+        AuthToken.objects.filter(key__in=[token.key for token in batch]).update(
+            created_at=Subquery(created))
+
+    batch = []
+    for key, user_id in (Token.objects.order_by('pk').values_list('key', 'user_id')
+                         .iterator(chunk_size=BATCH_SIZE)):
+        batch.append(AuthToken(key=key, user_id=user_id, device='',
+                               expires_at=expires_at))
+        if len(batch) >= BATCH_SIZE:
+            copy(batch)
+            batch = []
+    if batch:
+        copy(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_followsuggestion'),
+        ('authtoken', '0003_tokenproxy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthToken',
+            fields=[
+                ('key', models.CharField(max_length=40, primary_key=True, serialize=False)),
+                ('device', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='auth_tokens', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='authtoken_expires_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='authtoken',
+            constraint=models.UniqueConstraint(fields=('user', 'device'), name='authtoken_unique_device'),
+        ),
+        migrations.RunPython(copy_legacy_tokens, migrations.RunPython.noop),
+    ]
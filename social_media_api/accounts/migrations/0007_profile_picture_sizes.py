@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_authtoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_sizes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
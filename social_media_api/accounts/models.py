@@ -1,7 +1,13 @@
 # social_media_api/accounts/models.py
 
-from django.db import models
+import binascii
+import os
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+from django.db.models import F
 from django.contrib.auth.models import AbstractUser
+from social_media_api.counters import decremented, recount
 
 # User Model and Authentication
 class CustomUser(AbstractUser):
@@ -10,18 +16,247 @@ class CustomUser(AbstractUser):
     
     Attributes:
         bio (TextField): User's biography
-        profile_picture (ImageField): User's profile picture
-        followers (ManyToManyField): Users that follows this user
-        following (ManyToManyField): Users that this user follows
+        profile_picture (ImageField): User's profile picture, the processed
+            and metadata-stripped main image
+        profile_picture_sizes (JSONField): Thumbnail name -> stored path,
+            filled in by the image pipeline in accounts.images
+        following (ManyToManyField): Users that this user follows, stored as
+            Follow edges; the reverse accessor `followers` lists the users
+            that follow this user
+        followers_count (PositiveIntegerField): Number of followers
+        following_count (PositiveIntegerField): Number of users followed
     """
 
     bio = models.TextField(blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', 
                                         blank=True, null=True)
-    followers = models.ManyToManyField('self', symmetrical=False, 
-                                       related_name='followers_set')
-    following = models.ManyToManyField('self', symmetrical=False, 
-                                       related_name='following_set')
+    profile_picture_sizes = models.JSONField(default=dict, blank=True)
+    following = models.ManyToManyField('self', symmetrical=False,
+                                       through='Follow',
+                                       through_fields=('follower', 'followee'),
+                                       related_name='followers')
+    # Denormalized counters maintained by follow()/unfollow()
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     
     def __str__(self):
-        return self.username
\ No newline at end of file
+        return self.username
+
+    def _lock_follow_rows(self, user_ids):
+        """
+        Lock this user's row and those of `user_ids` in pk order. Every
+        follow edge change takes these locks first, so the existence checks
+        below are authoritative (a racing request for the same edge waits)
+        and concurrent follows in opposite directions cannot deadlock.
+        """
+        list(CustomUser.objects.select_for_update()
+             .filter(pk__in=[self.pk, *user_ids]).order_by('pk')
+             .values_list('pk', flat=True))
+
+    def _adjust_follow_counters(self, user_ids, delta):
+        if delta > 0:
+            followers_count = F('followers_count') + delta
+            following_count = F('following_count') + delta * len(user_ids)
+        else:
+            followers_count = decremented('followers_count', -delta)
+            following_count = decremented('following_count', -delta * len(user_ids))
+        CustomUser.objects.filter(pk__in=user_ids).update(followers_count=followers_count)
+        CustomUser.objects.filter(pk=self.pk).update(following_count=following_count)
+
+    def follow(self, user):
+        """Follow `user`. Returns True if a new edge was created."""
+        with transaction.atomic():
+            self._lock_follow_rows([user.pk])
+            _, created = Follow.objects.get_or_create(follower=self, followee=user)
+            if created:
+                self._adjust_follow_counters([user.pk], 1)
+        return created
+
+    def follow_many(self, users):
+        """
+        Follow every user in `users` (excluding self) with one existence
+        check and one bulk insert. Returns the users newly followed.
+        """
+        with transaction.atomic():
+            targets = {user.pk: user for user in users if user.pk != self.pk}
+            self._lock_follow_rows(targets)
+            already_following = set(
+                Follow.objects.filter(follower=self, followee_id__in=targets)
+                .values_list('followee_id', flat=True))
+            new_users = [user for pk, user in targets.items()
+                         if pk not in already_following]
+            if not new_users:
+                return []
+            # Under the row locks nobody else can insert these edges, so
+            # every one of them is inserted and counted exactly once
+            Follow.objects.bulk_create(
+                [Follow(follower=self, followee=user) for user in new_users],
+                ignore_conflicts=True)
+            self._adjust_follow_counters([user.pk for user in new_users], 1)
+        return new_users
+
+    def unfollow_many(self, users):
+        """Stop following every user in `users`. Returns the users unfollowed."""
+        with transaction.atomic():
+            by_pk = {user.pk: user for user in users}
+            self._lock_follow_rows(by_pk)
+            followed_ids = list(
+                Follow.objects.filter(follower=self, followee_id__in=by_pk)
+                .values_list('followee_id', flat=True))
+            if not followed_ids:
+                return []
+            Follow.objects.filter(follower=self, followee_id__in=followed_ids).delete()
+            self._adjust_follow_counters(followed_ids, -1)
+        return [by_pk[pk] for pk in followed_ids]
+
+    def unfollow(self, user):
+        """Stop following `user`. Returns True if an edge was removed."""
+        with transaction.atomic():
+            self._lock_follow_rows([user.pk])
+            deleted, _ = Follow.objects.filter(follower=self, followee=user).delete()
+            if deleted:
+                self._adjust_follow_counters([user.pk], -1)
+        return bool(deleted)
+
+# Follow edge model
+class Follow(models.Model):
+    """
+    Directed follow edge: `follower` follows `followee`.
+
+    The unique (follower, followee) index and the two created_at indexes
+    make "who does X follow" and "who follows X" single index range scans.
+    """
+
+    follower = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                                 related_name='following_edges')
+    followee = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                                 related_name='follower_edges')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'followee'],
+                                    name='follow_unique_edge'),
+        ]
+        indexes = [
+            models.Index(fields=['follower', '-created_at'],
+                         name='follow_follower_created_idx'),
+            models.Index(fields=['followee', '-created_at'],
+                         name='follow_followee_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower.username} follows {self.followee.username}"
+
+
+# Follow suggestion model
+class FollowSuggestion(models.Model):
+    """
+    Precomputed "who to follow" candidate, written by the
+    `compute_follow_suggestions` batch job.
+
+    Attributes:
+        user (ForeignKey): User the suggestion is for
+        candidate (ForeignKey): Suggested account
+        score (PositiveIntegerField): Number of accounts `user` follows that
+            follow `candidate` (friends-of-friends paths)
+        computed_at (DateTimeField): When the batch job produced the row
+    """
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                             related_name='follow_suggestions')
+    candidate = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                                  related_name='+')
+    score = models.PositiveIntegerField()
+    computed_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'candidate'],
+                                    name='suggestion_unique_candidate'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'],
+                         name='suggestion_user_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.candidate.username} for {self.user.username}"
+
+
+class AuthTokenManager(models.Manager):
+    ISSUE_ATTEMPTS = 3
+
+    def issue(self, user, device='', rotate=True):
+        """
+        Create a fresh token for `user` on `device`, rotating out any token
+        previously issued to the same device. Pass rotate=False for users
+        that cannot have tokens yet, such as during registration.
+        """
+        expires_at = timezone.now() + settings.AUTH_TOKEN_TTL
+        if not rotate:
+            return self.create(user=user, device=device, expires_at=expires_at)
+        for attempt in range(1, self.ISSUE_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    self.filter(user=user, device=device).delete()
+                    return self.create(user=user, device=device, expires_at=expires_at)
+            except IntegrityError:
+                # A concurrent login from the same device inserted its token
+                # between our delete and create; rotate that one out too
+                if attempt == self.ISSUE_ATTEMPTS:
+                    raise
+
+# Expiring authentication token model
+class AuthToken(models.Model):
+    """
+    Per-device API token with a sliding expiry.
+
+    Attributes:
+        key (CharField): Token sent in the Authorization header
+        user (ForeignKey): Token owner
+        device (CharField): Client the token was issued to; logging in again
+            from the same device rotates the token
+        expires_at (DateTimeField): Pushed forward while the token is used
+            and indexed so expired tokens can be purged in batches
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE,
+                             related_name='auth_tokens')
+    device = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    objects = AuthTokenManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'device'],
+                                    name='authtoken_unique_device'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='authtoken_expires_idx'),
+        ]
+
+    @classmethod
+    def generate_key(cls):
+        return binascii.hexlify(os.urandom(20)).decode()
+
+    def save(self, *args, **kwargs):
+        if not self.key:
+            self.key = self.generate_key()
+        return super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Token for {self.user.username} ({self.device or 'unknown device'})"
+
+
+# Denormalized follow counters and the Follow edges each one counts
+FOLLOW_COUNTERS = {'followers_count': (Follow, 'followee'),
+                   'following_count': (Follow, 'follower')}
+
+
+def recount_follow_counters(user_ids):
+    """Recompute followers_count/following_count for `user_ids` from edges."""
+    return recount(CustomUser, FOLLOW_COUNTERS, user_ids)
@@ -0,0 +1,8 @@
+# social_media_api/accounts/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class FollowCursorPagination(CursorPagination):
+    """Keyset pagination over follow edges, most recent first."""
+    ordering = ('-created_at', '-id')
@@ -2,16 +2,70 @@
 
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from rest_framework.authtoken.models import Token
+from .images import schedule_profile_picture, validate_profile_picture
+from .models import Follow, FollowSuggestion
 
 User = get_user_model()
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class ProfilePictureMixin:
+    """
+    Hands uploaded profile pictures to the background image pipeline
+    instead of storing them as-is during the request.
+    """
+
+    def validate_profile_picture(self, value):
+        if value is not None:
+            validate_profile_picture(value)
+        return value
+
+    def pop_profile_picture(self, validated_data):
+        return validated_data.pop('profile_picture', None)
+
+
+class CustomUserSerializer(ProfilePictureMixin, serializers.ModelSerializer):
+    profile_picture_urls = serializers.SerializerMethodField()
+
     class Meta:
         model = User
-        fields = ['id', 'username', 'bio', 'profile_picture', 'followers']
+        fields = ['id', 'username', 'bio', 'profile_picture', 'profile_picture_urls',
+                  'followers_count', 'following_count']
+        read_only_fields = ['followers_count', 'following_count']
 
-class RegisterSerializer(serializers.ModelSerializer):
+    def get_profile_picture_urls(self, obj):
+        storage = obj.profile_picture.storage
+        request = self.context.get('request')
+        urls = {}
+        for name, path in obj.profile_picture_sizes.items():
+            url = storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
+
+    def update(self, instance, validated_data):
+        upload = self.pop_profile_picture(validated_data)
+        instance = super().update(instance, validated_data)
+        if upload is not None:
+            schedule_profile_picture(instance, upload)
+        return instance
+
+class FollowerSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='follower.id')
+    username = serializers.ReadOnlyField(source='follower.username')
+    followed_at = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ['id', 'username', 'followed_at']
+
+class FollowingSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='followee.id')
+    username = serializers.ReadOnlyField(source='followee.username')
+    followed_at = serializers.DateTimeField(source='created_at', read_only=True)
+
+    class Meta:
+        model = Follow
+        fields = ['id', 'username', 'followed_at']
+
+class RegisterSerializer(ProfilePictureMixin, serializers.ModelSerializer):
     password = serializers.CharField()
     class Meta:
         model = User
@@ -21,13 +75,26 @@ class RegisterSerializer(serializers.ModelSerializer):
         }
 
     def create(self, validated_data):
-        password = validated_data.pop('password')
-        user = get_user_model().objects.create_user(**validated_data)
-        user.set_password(password)
-        user.save()
-        Token.objects.create(user=user)
+        upload = self.pop_profile_picture(validated_data)
+        # create_user hashes the password and saves the user exactly once
+        user = User.objects.create_user(**validated_data)
+        if upload is not None:
+            schedule_profile_picture(user, upload)
         return user
     
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='candidate.id')
+    username = serializers.ReadOnlyField(source='candidate.username')
+    mutual_count = serializers.ReadOnlyField(source='score')
+
+    class Meta:
+        model = FollowSuggestion
+        fields = ['id', 'username', 'mutual_count']
+
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(child=serializers.IntegerField(),
+                                     allow_empty=False, max_length=500)
+
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField()
\ No newline at end of file
@@ -0,0 +1,26 @@
+# social_media_api/accounts/signals.py
+
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .authentication import invalidate_token, revoke_token
+from .models import AuthToken
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=AuthToken)
+def revoke_deleted_token(sender, instance, **kwargs):
+    # Logout, rotation on re-login, expiry purges and user deletion
+    revoke_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(sender, instance, created=False, update_fields=None, **kwargs):
+    # Cached token entries hold is_active, so deactivation must not be
+    # served from them; everything else about the user is read fresh. New
+    # users have no tokens
+    if created or (update_fields is not None and 'is_active' not in update_fields):
+        return
+    for key in AuthToken.objects.filter(user=instance).values_list('key', flat=True):
+        invalidate_token(key)
@@ -1,3 +1,447 @@
-from django.test import TestCase
+import csv
+import os
+import tempfile
+from importlib import import_module
+from io import BytesIO, StringIO
+from django.apps import apps
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.signals import user_login_failed
+from rest_framework.test import APIClient
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from django.core.cache import cache
+from datetime import timedelta
+from unittest import mock
+from django.utils import timezone
+from PIL import Image
+from .authentication import _cache_key, local_revocations, local_token_cache
+from .hashing import password_checks
+from .throttling import SlidingWindowRateThrottle
+from .models import AuthToken, Follow
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FollowTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def test_follow_and_unfollow_write_a_single_edge(self):
+        response = self.client.post(reverse('follow-user', kwargs={'user_id': self.other.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(Follow.objects.filter(follower=self.user, followee=self.other).exists())
+        self.assertEqual(list(self.other.followers.all()), [self.user])
+        self.assertEqual(list(self.user.following.all()), [self.other])
+
+        self.client.post(reverse('unfollow-user', kwargs={'user_id': self.other.id}))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_profile_etag_follows_counters(self):
+        url = reverse('profile')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.post(reverse('follow-user', kwargs={'user_id': self.other.id}))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['following_count'], 1)
+
+    def test_follow_counters_and_profile_stay_constant_size(self):
+        self.client.post(reverse('follow-user', kwargs={'user_id': self.other.id}))
+        self.client.post(reverse('follow-user', kwargs={'user_id': self.other.id}))
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.followers_count, 1)
+
+        self.client.force_authenticate(user=self.other)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertNotIn('followers', response.data)
+
+        self.client.post(reverse('unfollow-user', kwargs={'user_id': self.user.id}))
+        self.client.force_authenticate(user=self.user)
+        self.client.post(reverse('unfollow-user', kwargs={'user_id': self.other.id}))
+        self.user.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.user.following_count, self.other.followers_count), (0, 0))
+
+    def test_unfollow_stops_drifted_counters_at_zero(self):
+        self.user.follow(self.other)
+        User.objects.update(followers_count=0, following_count=0)
+        response = self.client.post(reverse('unfollow-user', kwargs={'user_id': self.other.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(User.objects.order_by('pk').values_list(
+            'followers_count', 'following_count')), [(0, 0), (0, 0)])
+
+    def test_reconcile_repairs_drifted_follow_counters(self):
+        self.user.follow(self.other)
+        User.objects.update(followers_count=7, following_count=0)
+        call_command('reconcile_follow_counters', batch_size=1, stdout=StringIO())
+        self.assertEqual(list(User.objects.order_by('pk').values_list(
+            'followers_count', 'following_count')), [(0, 1), (1, 0)])
+
+    def test_follower_and_following_lists_are_paginated(self):
+        fans = [User.objects.create_user(username=f'fan{i}', password='testpass123')
+                for i in range(12)]
+        for fan in fans:
+            fan.follow(self.other)
+
+        response = self.client.get(reverse('follower-list', kwargs={'user_id': self.other.id}))
+        self.assertEqual(len(response.data['results']), 10)
+        self.assertEqual(response.data['results'][0]['username'], 'fan11')
+        response = self.client.get(response.data['next'])
+        self.assertEqual(len(response.data['results']), 2)
+
+        response = self.client.get(reverse('following-list', kwargs={'user_id': fans[0].id}))
+        self.assertEqual([u['username'] for u in response.data['results']], ['other'])
+
+    def test_cannot_follow_yourself(self):
+        response = self.client.post(reverse('follow-user', kwargs={'user_id': self.user.id}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Follow.objects.exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class BulkFollowTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.others = [User.objects.create_user(username=f'other{i}', password='testpass123')
+                       for i in range(5)]
+        self.client.force_authenticate(user=self.user)
+
+    def test_bulk_follow_skips_existing_edges_and_self(self):
+        self.user.follow(self.others[0])
+        ids = [user.id for user in self.others] + [self.user.id, 999]
+        response = self.client.post(reverse('bulk-follow'), {'user_ids': ids}, format='json')
+        self.assertEqual(sorted(response.data['followed']),
+                         [user.id for user in self.others[1:]])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.following_count, 5)
+
+        response = self.client.post(reverse('bulk-unfollow'),
+                                    {'user_ids': ids[:2]}, format='json')
+        self.assertEqual(sorted(response.data['unfollowed']), ids[:2])
+        self.user.refresh_from_db()
+        self.others[0].refresh_from_db()
+        self.assertEqual((self.user.following_count, self.others[0].followers_count), (3, 0))
+
+    def test_import_follows_from_csv(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as handle:
+            handle.write('follower,followee\nuser,other0\nother1,other0\n'
+                         'other1,missing\nuser,other0\n')
+        self.addCleanup(os.remove, handle.name)
+
+        call_command('import_follows', handle.name, batch_size=2, stdout=StringIO())
+        self.assertEqual(Follow.objects.count(), 2)
+        self.others[0].refresh_from_db()
+        self.assertEqual(self.others[0].followers_count, 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FollowSuggestionTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.users = {name: User.objects.create_user(username=name, password='testpass123')
+                      for name in ('ama', 'kofi', 'esi', 'yaw', 'abena')}
+        follows = [('ama', 'kofi'), ('ama', 'esi'), ('kofi', 'yaw'), ('esi', 'yaw'),
+                   ('esi', 'abena'), ('kofi', 'ama')]
+        for follower, followee in follows:
+            self.users[follower].follow(self.users[followee])
+        self.client.force_authenticate(user=self.users['ama'])
+
+    def test_suggestions_rank_friends_of_friends(self):
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([(s['username'], s['mutual_count']) for s in response.data],
+                         [('yaw', 2), ('abena', 1)])
+
+        self.users['ama'].follow(self.users['yaw'])
+        response = self.client.get(reverse('follow-suggestions'))
+        self.assertEqual([s['username'] for s in response.data], ['abena'])
+
+    def test_users_following_nobody_lose_their_suggestions(self):
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        self.users['ama'].unfollow_many(User.objects.all())
+        call_command('compute_follow_suggestions', stdout=StringIO())
+        self.assertEqual(self.client.get(reverse('follow-suggestions')).data, [])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class CachedTokenAuthenticationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_token_cache.clear()
+        local_revocations.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.token = AuthToken.objects.issue(self.user, 'laptop')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeated_requests_skip_the_token_query(self):
+        url = reverse('following-list', kwargs={'user_id': self.user.id})
+        with self.assertNumQueries(2):  # token lookup + follow edges
+            self.client.get(url)
+        with self.assertNumQueries(1):  # follow edges only
+            self.client.get(url)
+
+    def test_cache_holds_no_user_data(self):
+        url = reverse('following-list', kwargs={'user_id': self.user.id})
+        self.client.get(url)
+        self.assertEqual(cache.get(_cache_key(self.token.key)),
+                         (self.user.pk, True, self.token.key, self.token.expires_at))
+
+    def test_cached_token_reads_the_user_fresh(self):
+        url = reverse('post-list')
+        self.client.post(url, {'title': 'First', 'content': 'Content'})
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        response = self.client.post(url, {'title': 'Second', 'content': 'Content'})
+        self.assertEqual(response.data['author'], 'renamed')
+
+    def test_logout_revokes_cached_token(self):
+        url = reverse('profile')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(self.client.post(reverse('logout')).status_code, 200)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_deactivation_revokes_cached_token(self):
+        url = reverse('profile')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_expired_token_is_rejected(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_use_slides_expiry_at_most_once_per_interval(self):
+        stale = timezone.now() + timedelta(days=3)
+        AuthToken.objects.filter(pk=self.token.pk).update(expires_at=stale)
+        self.client.get(reverse('profile'))
+        self.token.refresh_from_db()
+        self.assertGreater(self.token.expires_at, timezone.now() + timedelta(days=13))
+        # A freshly extended token is served from cache without another write
+        with self.assertNumQueries(1):  # profile read only
+            self.client.get(reverse('profile'))
+
+    def test_login_rotates_token_per_device(self):
+        login = {'username': 'user', 'password': 'testpass123'}
+        phone = self.client.post(reverse('login'), {**login, 'device': 'phone'})
+        laptop = self.client.post(reverse('login'), {**login, 'device': 'laptop'})
+        self.assertEqual(AuthToken.objects.filter(user=self.user).count(), 2)
+        self.assertNotEqual(laptop.data['token'], self.token.key)
+        # The laptop's previous token was rotated out; the phone's still works
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Token {phone.data['token']}")
+        self.assertEqual(self.client.get(reverse('profile')).status_code, 200)
+
+    def test_login_racing_on_the_same_device_is_retried(self):
+        create = AuthToken.objects.create
+        raced = []
+
+        def racing_create(**kwargs):
+            if not raced:
+                # Another login for the device inserts its token first
+                raced.append(create(**kwargs))
+            return create(**kwargs)
+
+        with mock.patch.object(AuthToken.objects, 'create', side_effect=racing_create):
+            token = AuthToken.objects.issue(self.user, 'laptop')
+        self.assertEqual(list(AuthToken.objects.filter(user=self.user, device='laptop')),
+                         [token])
+
+    def test_legacy_tokens_keep_their_creation_time(self):
+        migration = import_module('accounts.migrations.0006_authtoken')
+        legacy = Token.objects.create(user=self.user)
+        created = timezone.now() - timedelta(days=30)
+        Token.objects.filter(pk=legacy.pk).update(created=created)
+        migration.copy_legacy_tokens(apps, None)
+        self.assertEqual(AuthToken.objects.get(pk=legacy.key).created_at, created)
+
+    def test_revoked_token_is_rejected_without_queries(self):
+        self.client.post(reverse('logout'))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('profile')).status_code, 401)
+
+    def test_purge_expired_tokens(self):
+        AuthToken.objects.filter(pk=self.token.pk).update(
+            expires_at=timezone.now() - timedelta(days=1))
+        fresh = AuthToken.objects.issue(self.user, 'phone')
+        with mock.patch('accounts.signals.revoke_token') as revoke_token:
+            call_command('purge_expired_tokens', batch_size=1, stdout=StringIO())
+        revoke_token.assert_not_called()
+        self.assertEqual(list(AuthToken.objects.values_list('key', flat=True)),
+                         [fresh.key])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class LoginProtectionTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        # Pin the clock mid-window: near a window boundary the sliding
+        # estimate discounts the previous window's attempts
+        timer = mock.patch.object(SlidingWindowRateThrottle, 'timer',
+                                  return_value=60 * 1000 + 30)
+        timer.start()
+        self.addCleanup(timer.stop)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.url = reverse('login')
+
+    def login(self, password='testpass123', **extra):
+        return self.client.post(self.url, {'username': 'user', 'password': password},
+                                **extra)
+
+    @override_settings(LOGIN_THROTTLE_USERNAME_RATE='3/min')
+    def test_username_is_throttled_across_ips(self):
+        for address in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            self.assertEqual(self.login('wrong', REMOTE_ADDR=address).status_code, 401)
+        response = self.login(REMOTE_ADDR='10.0.0.4')
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(LOGIN_THROTTLE_IP_RATE='2/min')
+    def test_ip_is_throttled_across_usernames(self):
+        User.objects.create_user(username='other', password='testpass123')
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.client.post(self.url, {'username': 'other',
+                                                     'password': 'x'}).status_code, 401)
+        self.assertEqual(self.login().status_code, 429)
+
+    @override_settings(LOGIN_THROTTLE_IP_RATE='2/min')
+    def test_forged_forwarded_for_does_not_evade_ip_throttle(self):
+        # The router appends the real client address after any forged ones
+        statuses = [self.login('wrong', HTTP_X_FORWARDED_FOR=f'10.9.9.{i}, 10.0.0.1').status_code
+                    for i in range(4)]
+        self.assertEqual(statuses, [401, 401, 429, 429])
+
+    def test_non_object_body_is_rejected(self):
+        for body in (['user'], 'user'):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400)
+
+    @override_settings(LOGIN_HASH_WORKERS=2)
+    def test_pooled_password_check(self):
+        self.assertEqual(self.login().status_code, 200)
+        with mock.patch.object(user_login_failed, 'send') as failed:
+            self.assertEqual(self.login('wrong').status_code, 401)
+        self.assertEqual(failed.call_args.kwargs['credentials']['username'], 'user')
+        self.assertEqual(self.client.post(self.url, {'username': 'nobody',
+                                                     'password': 'x'}).status_code, 401)
+
+    @override_settings(LOGIN_HASH_WORKERS=1, LOGIN_HASH_QUEUE_SIZE=0)
+    def test_saturated_pool_fails_fast(self):
+        _, slots = password_checks._ensure_pool()
+        slots.acquire()
+        try:
+            self.assertEqual(self.login().status_code, 503)
+        finally:
+            slots.release()
+        self.assertEqual(self.login().status_code, 200)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class RegistrationTestCase(TestCase):
+    def test_register_hashes_once_and_issues_one_token(self):
+        client = APIClient()
+        with self.assertNumQueries(5):  # unique check, savepoint, user, token, release
+            response = client.post(reverse('register'),
+                                   {'username': 'new', 'password': 'testpass123'})
+        self.assertEqual(response.status_code, 201)
+        user = User.objects.get(username='new')
+        self.assertTrue(user.check_password('testpass123'))
+        self.assertEqual(list(AuthToken.objects.filter(user=user)
+                              .values_list('key', flat=True)), [response.data['token']])
+
+    def test_provision_users(self):
+        User.objects.create_user(username='seed2', password='other')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'tokens.csv')
+            call_command('provision_users', 3, prefix='seed', password='seedpass',
+                         tokens=path, batch_size=2, stdout=StringIO())
+            with open(path) as handle:
+                rows = list(csv.DictReader(handle))
+        self.assertEqual(sorted(User.objects.values_list('username', flat=True)),
+                         ['seed1', 'seed2', 'seed3'])
+        self.assertTrue(User.objects.get(username='seed3').check_password('seedpass'))
+        self.assertEqual(len(rows), 3)
+        token = AuthToken.objects.get(key=rows[0]['token'])
+        self.assertEqual(token.user.username, rows[0]['username'])
+
+
+def make_image(size=(800, 600), image_format='JPEG'):
+    image = Image.new('RGB', size, 'teal')
+    exif = Image.Exif()
+    exif[0x010F] = 'Test Camera'
+    buffer = BytesIO()
+    image.save(buffer, format=image_format, exif=exif.tobytes())
+    return SimpleUploadedFile(f'me.{image_format.lower()}', buffer.getvalue(),
+                              content_type=f'image/{image_format.lower()}')
+
+
+class ProfilePictureTestCase(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        overrides = override_settings(
+            SECURE_SSL_REDIRECT=False,
+            PROFILE_PICTURES_ASYNC=False,
+            PROFILE_PICTURE_STAGING_DIR=os.path.join(self.media.name, 'staging'),
+            PROFILE_PICTURE_SIZES={'small': 64, 'medium': 256},
+            PROFILE_PICTURE_MAX_DIMENSION=400,
+            # Local filesystem stand-in for S3
+            STORAGES={
+                'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+                'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+            },
+            MEDIA_ROOT=self.media.name)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+
+    def upload(self, upload):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.put(reverse('profile'), {'profile_picture': upload},
+                                   format='multipart')
+
+    def test_upload_is_stripped_resized_and_thumbnailed(self):
+        self.assertEqual(self.upload(make_image()).status_code, 200)
+        self.user.refresh_from_db()
+        self.assertRegex(self.user.profile_picture.name, r'^profile_pics/[0-9a-f]{20}\.jpg$')
+        with Image.open(self.user.profile_picture.path) as main:
+            self.assertEqual(main.size, (400, 300))
+            self.assertEqual(len(main.getexif()), 0)
+        for name, size in (('small', 64), ('medium', 256)):
+            path = os.path.join(self.media.name, self.user.profile_picture_sizes[name])
+            with Image.open(path) as thumbnail:
+                self.assertEqual(thumbnail.size, (size, size))
+        self.assertEqual(os.listdir(os.path.join(self.media.name, 'staging')), [])
+
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(set(response.data['profile_picture_urls']), {'small', 'medium'})
+        self.assertTrue(response.data['profile_picture_urls']['small'].startswith('/media/'))
+
+    def test_identical_uploads_share_files(self):
+        self.upload(make_image())
+        first = User.objects.get(pk=self.user.pk).profile_picture_sizes
+        self.upload(make_image())
+        self.assertEqual(User.objects.get(pk=self.user.pk).profile_picture_sizes, first)
+
+    def test_invalid_upload_is_rejected(self):
+        bogus = SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg')
+        self.assertEqual(self.upload(bogus).status_code, 400)
+        with self.settings(PROFILE_PICTURE_MAX_PIXELS=100):
+            self.assertEqual(self.upload(make_image()).status_code, 400)
@@ -0,0 +1,75 @@
+# social_media_api/accounts/throttling.py
+
+import hashlib
+from collections.abc import Mapping
+from django.conf import settings
+from rest_framework.throttling import SimpleRateThrottle
+
+
+class SlidingWindowRateThrottle(SimpleRateThrottle):
+    """
+    Rate throttle using a sliding-window counter: two integer counters per
+    client (this window and the previous one), with the previous window
+    weighted by how much of it still overlaps the sliding window. This costs
+    one get_many and one incr per request, where SimpleRateThrottle reads
+    and rewrites a list holding every request timestamp.
+    """
+
+    rate_setting = None
+
+    def get_rate(self):
+        # Read at request time so rates follow override_settings
+        return getattr(settings, self.rate_setting)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        overlap = 1 - (now % self.duration) / self.duration
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        estimate = counts.get(previous_key, 0) * overlap + counts.get(current_key, 0)
+        if estimate >= self.num_requests:
+            self.wait_seconds = overlap * self.duration
+            return False
+
+        # Each counter must outlive the following window, which reads it
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginIPRateThrottle(SlidingWindowRateThrottle):
+    scope = 'login_ip'
+    rate_setting = 'LOGIN_THROTTLE_IP_RATE'
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope,
+                                    'ident': self.get_ident(request)}
+
+
+class LoginUsernameRateThrottle(SlidingWindowRateThrottle):
+    """Limits guesses against one account, however many IPs they come from."""
+
+    scope = 'login_username'
+    rate_setting = 'LOGIN_THROTTLE_USERNAME_RATE'
+
+    def get_cache_key(self, request, view):
+        # A JSON list or scalar body has no username; the view rejects it
+        username = request.data.get('username') if isinstance(request.data, Mapping) else None
+        if not username:
+            return None
+        ident = hashlib.sha256(str(username).lower().encode()).hexdigest()
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
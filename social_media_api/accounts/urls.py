@@ -1,17 +1,25 @@
 # social_media_api/accounts/urls.py
 
 from django.urls import path
-from .views import (RegisterView, LoginView, ProfileView, 
-                    FollowUserView, UnfollowUserView)
+from .views import (RegisterView, LoginView, LogoutView, ProfileView, 
+                    FollowUserView, UnfollowUserView, FollowerListView,
+                    FollowingListView, BulkFollowView, BulkUnfollowView,
+                    FollowSuggestionListView)
 
 urlpatterns = [
 
     # Registration/Login/Profile URLs
     path('register/', RegisterView.as_view(), name='register'), # User registration
     path('login/', LoginView.as_view(), name='login'), # User login
+    path('logout/', LogoutView.as_view(), name='logout'), # User logout
     path('profile/', ProfileView.as_view(), name='profile'), # User profile management
 
     # Follow/Unfollow URLs
     path('follow/<int:user_id>/', FollowUserView.as_view(), name='follow-user'), # Follow
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'), # Unfollow
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'), # Follow many
+    path('unfollow/bulk/', BulkUnfollowView.as_view(), name='bulk-unfollow'), # Unfollow many
+    path('<int:user_id>/followers/', FollowerListView.as_view(), name='follower-list'), # Followers
+    path('<int:user_id>/following/', FollowingListView.as_view(), name='following-list'), # Following
+    path('suggestions/', FollowSuggestionListView.as_view(), name='follow-suggestions'), # Who to follow
 ]
\ No newline at end of file
@@ -3,13 +3,27 @@
 from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from .serializers import RegisterSerializer, CustomUserSerializer, LoginSerializer
+from .serializers import (RegisterSerializer, CustomUserSerializer, LoginSerializer,
+                          FollowerSerializer, FollowingSerializer,
+                          BulkFollowSerializer, FollowSuggestionSerializer)
+from .pagination import FollowCursorPagination
+from .hashing import PasswordCheckBusy, authenticate_login
+from .throttling import LoginIPRateThrottle, LoginUsernameRateThrottle
 from rest_framework.permissions import AllowAny
 from rest_framework.permissions import IsAuthenticated
-from .models import CustomUser
+from .models import AuthToken, CustomUser, Follow, FollowSuggestion
 from rest_framework import permissions
+from django.conf import settings
+from django.db import transaction
+from posts.timeline import backfill_timeline, remove_from_timeline, schedule_follower_backfill
+from notifications.dispatch import notify
+from social_media_api.conditional import conditional_get, make_etag
+
+
+def get_device(request):
+    # Clients may name themselves; otherwise fall back to the User-Agent
+    device = request.data.get('device') or request.META.get('HTTP_USER_AGENT', '')
+    return str(device)[:100]
 
 # Registration View to Return a Token
 class RegisterView(APIView):
@@ -18,8 +32,10 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            token, _ = Token.objects.get_or_create(user=user)
+            # The user and their first token are written together or not at all
+            with transaction.atomic():
+                user = serializer.save()
+                token = AuthToken.objects.issue(user, get_device(request), rotate=False)
             return Response({
                 'status': 'User created successfully',
                 'token': token.key,
@@ -33,32 +49,61 @@ class RegisterView(APIView):
 # Login View to Return a Token
 class LoginView(APIView):
     permission_classes = [AllowAny]
+    # Throttled before any password hashing happens
+    throttle_classes = [LoginIPRateThrottle, LoginUsernameRateThrottle]
 
     def post(self, request):
         serializer = LoginSerializer(data=request.data)
         if serializer.is_valid():
             username = serializer.validated_data['username']
             password = serializer.validated_data['password']
-            user = authenticate(username=username, password=password)
+            try:
+                user = authenticate_login(request, username, password)
+            except PasswordCheckBusy:
+                return Response({'error': 'Too many login attempts in progress, try again shortly'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                headers={'Retry-After': '1'})
             if user is not None:
-                token, _ = Token.objects.get_or_create(user=user)
+                # Logging in again from the same device rotates its token
+                token = AuthToken.objects.issue(user, get_device(request))
                 return Response({
-                    'token': token.key
+                    'token': token.key,
+                    'expires_at': token.expires_at
                 }, status=status.HTTP_200_OK)
             return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Logout View to Revoke the Token
+class LogoutView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Deleting the token revokes it and evicts it from the authentication
+        # cache; tokens issued to the user's other devices stay valid
+        if request.auth is not None:
+            request.auth.delete()
+        return Response({'message': 'Logged out successfully'},
+                        status=status.HTTP_200_OK)
+
 # Profile View for Profile Management    
 class ProfileView(APIView):
     permission_classes = [IsAuthenticated]
+    version_fields = ('id', 'username', 'bio', 'profile_picture',
+                      'profile_picture_sizes', 'followers_count', 'following_count')
 
     def get(self, request):
-        user = request.user
-        serializer = CustomUserSerializer(user)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        # request.user may come from the token cache; counters are updated
+        # in the database directly, so read the profile fresh
+        user = CustomUser.objects.get(pk=request.user.pk)
+        # The row is its own version probe: an unchanged profile is answered
+        # with 304 before the serializer builds any picture URLs
+        etag = make_etag(*(getattr(user, field) for field in self.version_fields))
+        return conditional_get(request, etag, lambda: Response(
+            CustomUserSerializer(user).data, status=status.HTTP_200_OK))
     
     def put(self, request):
-        user = request.user
+        # Save a fresh instance so stale cached counters are never written back
+        user = CustomUser.objects.get(pk=request.user.pk)
         serializer = CustomUserSerializer(user, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
@@ -77,7 +122,11 @@ class FollowUserView(generics.GenericAPIView):
             if user_to_follow == request.user:
                 return Response({"error": "You cannot follow yourself"}, 
                                 status=status.HTTP_400_BAD_REQUEST)
-            request.user.following.add(user_to_follow)
+            with transaction.atomic():
+                if request.user.follow(user_to_follow):
+                    backfill_timeline(request.user, user_to_follow)
+                    notify(user_to_follow, request.user, 'started following you',
+                           user_to_follow)
             return Response({"message": "User followed successfully"}, 
                             status=status.HTTP_200_OK)
         except CustomUser.DoesNotExist:
@@ -93,9 +142,91 @@ class UnfollowUserView(generics.GenericAPIView):
     def post(self, request, user_id):
         try:
             user_to_unfollow = self.get_queryset().get(id=user_id)
-            request.user.following.remove(user_to_unfollow)
+            with transaction.atomic():
+                if request.user.unfollow(user_to_unfollow):
+                    remove_from_timeline(request.user, user_to_unfollow)
+                    schedule_follower_backfill(user_to_unfollow)
             return Response({"message": "User unfollowed successfully"}, 
                             status=status.HTTP_200_OK)
         except CustomUser.DoesNotExist:
             return Response({"error": "User not found"}, 
                             status=status.HTTP_404_NOT_FOUND)
+
+
+
+# Paginated list of the users following a user
+class FollowerListView(generics.ListAPIView):
+    serializer_class = FollowerSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FollowCursorPagination
+
+    def get_queryset(self):
+        return (Follow.objects.filter(followee_id=self.kwargs['user_id'])
+                .select_related('follower'))
+
+
+# Paginated list of the users a user follows
+class FollowingListView(generics.ListAPIView):
+    serializer_class = FollowingSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FollowCursorPagination
+
+    def get_queryset(self):
+        return (Follow.objects.filter(follower_id=self.kwargs['user_id'])
+                .select_related('followee'))
+
+
+
+# Follow many users in one request
+class BulkFollowView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Resolve every target in one query
+        targets = CustomUser.objects.filter(pk__in=serializer.validated_data['user_ids'])
+        with transaction.atomic():
+            followed = request.user.follow_many(targets)
+            if followed:
+                backfill_timeline(request.user, *followed)
+            for user in followed:
+                notify(user, request.user, 'started following you', user)
+        return Response({"message": "Users followed successfully",
+                         "followed": [user.pk for user in followed]},
+                        status=status.HTTP_200_OK)
+
+
+# Unfollow many users in one request
+class BulkUnfollowView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        targets = CustomUser.objects.filter(pk__in=serializer.validated_data['user_ids'])
+        with transaction.atomic():
+            unfollowed = request.user.unfollow_many(targets)
+            if unfollowed:
+                remove_from_timeline(request.user, *unfollowed)
+                schedule_follower_backfill(*unfollowed)
+        return Response({"message": "Users unfollowed successfully",
+                         "unfollowed": [user.pk for user in unfollowed]},
+                        status=status.HTTP_200_OK)
+
+
+
+# "Who to follow" suggestions precomputed by compute_follow_suggestions
+class FollowSuggestionListView(generics.ListAPIView):
+    serializer_class = FollowSuggestionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = None
+
+    def get_queryset(self):
+        user = self.request.user
+        # Accounts followed since the last batch run are filtered out here
+        followed_ids = Follow.objects.filter(follower=user).values('followee_id')
+        return (FollowSuggestion.objects.filter(user=user)
+                .exclude(candidate_id__in=followed_ids)
+                .select_related('candidate')
+                .order_by('-score')[:settings.FOLLOW_SUGGESTIONS_TOP_K])
@@ -0,0 +1,26 @@
+# social_media_api/notifications/cache.py
+
+from django.conf import settings
+from django.core.cache import cache
+from .models import Notification
+
+
+def _unread_count_key(user_id):
+    return f'notifications:unread-count:{user_id}'
+
+
+def get_unread_count(user):
+    """
+    Number of unread notifications for `user`, served from the cache and
+    recounted over the (recipient, is_read, timestamp) index on a miss.
+    """
+    key = _unread_count_key(user.pk)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient=user, is_read=False).count()
+        cache.set(key, count, settings.NOTIFICATION_UNREAD_COUNT_TTL)
+    return count
+
+
+def invalidate_unread_count(*user_ids):
+    cache.delete_many([_unread_count_key(user_id) for user_id in user_ids])
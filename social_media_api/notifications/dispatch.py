@@ -0,0 +1,246 @@
+# social_media_api/notifications/dispatch.py
+
+import atexit
+import logging
+import operator
+import queue
+import threading
+import time
+from collections import namedtuple
+from functools import reduce
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from .cache import invalidate_unread_count
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+NotificationEvent = namedtuple('NotificationEvent', [
+    'recipient_id', 'actor_id', 'verb', 'target_content_type_id',
+    'target_object_id', 'target_summary',
+])
+
+
+class NotificationDispatcher:
+    """
+    Moves notification inserts out of the request path.
+
+    Events are put on an in-process queue and drained by a small pool of
+    daemon worker threads. Each worker collects up to NOTIFICATION_BATCH_SIZE
+    events (or whatever arrives within NOTIFICATION_FLUSH_INTERVAL seconds),
+    drops duplicates and folds the batch into notification groups with one
+    bulk update and one bulk insert. With NOTIFICATIONS_ASYNC disabled
+    (e.g. in tests) events are written inline.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self._workers = []
+        self._lock = threading.Lock()
+
+    def enqueue(self, event):
+        self.enqueue_many([event])
+
+    def enqueue_many(self, events):
+        if not settings.NOTIFICATIONS_ASYNC:
+            self.write(events)
+            return
+        self._ensure_workers()
+        for event in events:
+            self.queue.put(event)
+
+    def flush(self, timeout=None):
+        """Wait until every queued event has been written (or `timeout`)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks and any(
+                worker.is_alive() for worker in self._workers):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+
+    def write(self, events):
+        """
+        Fold `events` into notification groups keyed on (recipient, verb,
+        target) and return the number of groups touched.
+
+        Missing groups are first inserted empty (skipping any a concurrent
+        writer inserts meanwhile), then every group of the batch is locked
+        in key order and merged into, so concurrent batches for the same new
+        group both land in it rather than one side's actors being dropped.
+        """
+        groups, summaries = {}, {}
+        for event in dict.fromkeys(events):
+            key = (event.recipient_id, event.verb,
+                   event.target_content_type_id, event.target_object_id)
+            groups.setdefault(key, []).append(event.actor_id)
+            summaries[key] = event.target_summary
+        if not groups:
+            return 0
+
+        actor_ids = {actor_id for actors in groups.values() for actor_id in actors}
+        usernames = dict(User.objects.filter(pk__in=actor_ids)
+                         .values_list('pk', 'username'))
+        keep = settings.NOTIFICATION_LATEST_ACTORS
+        now = timezone.now()
+        # Actors deleted since they acted are dropped, so the group's actor
+        # is always a user that still exists
+        groups = {key: present for key, actors in groups.items()
+                  if (present := [actor_id for actor_id in actors if actor_id in usernames])}
+        if not groups:
+            return 0
+
+        lookup = reduce(operator.or_, (
+            Q(recipient_id=recipient_id, verb=verb,
+              target_content_type_id=content_type_id,
+              target_object_id=object_id)
+            for recipient_id, verb, content_type_id, object_id in groups
+        ))
+        with transaction.atomic():
+            missing = []
+            for key in sorted(groups.keys() - self._existing_keys(lookup)):
+                recipient_id, verb, content_type_id, object_id = key
+                missing.append(Notification(
+                    recipient_id=recipient_id, actor_id=groups[key][-1], verb=verb,
+                    target_content_type_id=content_type_id, target_object_id=object_id,
+                    target_summary=summaries[key], actor_count=0, latest_actors=[]))
+            Notification.objects.bulk_create(
+                missing, batch_size=settings.NOTIFICATION_BATCH_SIZE,
+                ignore_conflicts=True)
+
+            locked = {
+                (notification.recipient_id, notification.verb,
+                 notification.target_content_type_id,
+                 notification.target_object_id): notification
+                for notification in Notification.objects.select_for_update().filter(lookup)
+                .order_by('recipient_id', 'verb', 'target_content_type_id',
+                          'target_object_id')
+            }
+            updated, recreated = [], []
+            for key in sorted(groups):
+                notification = locked.get(key)
+                if notification is None:
+                    # Archived (see archive_notifications) after we saw it;
+                    # start the group over rather than drop the events
+                    recipient_id, verb, content_type_id, object_id = key
+                    notification = Notification(
+                        recipient_id=recipient_id, verb=verb,
+                        target_content_type_id=content_type_id,
+                        target_object_id=object_id, actor_count=0, latest_actors=[])
+                    recreated.append(notification)
+                else:
+                    updated.append(notification)
+                actors = groups[key]
+                # Newest actor first, each actor counted once per batch
+                names = [usernames[actor_id] for actor_id in reversed(actors)]
+                names = list(dict.fromkeys(names))
+                # Repeat actors are only recognised while they are among the
+                # latest actors, so actor_count is exact for small groups and
+                # an upper bound for very large ones
+                new_names = [name for name in names
+                             if name not in notification.latest_actors]
+                notification.actor_id = actors[-1]
+                notification.actor_count += len(new_names)
+                notification.latest_actors = list(dict.fromkeys(
+                    names + notification.latest_actors))[:keep]
+                notification.target_summary = summaries[key]
+                notification.timestamp = now
+                notification.is_read = False
+
+            Notification.objects.bulk_create(
+                recreated, batch_size=settings.NOTIFICATION_BATCH_SIZE)
+            Notification.objects.bulk_update(
+                updated, ['actor', 'actor_count', 'latest_actors',
+                          'target_summary', 'timestamp', 'is_read'],
+                batch_size=settings.NOTIFICATION_BATCH_SIZE)
+        invalidate_unread_count(*{key[0] for key in groups})
+        return len(groups)
+
+    def _existing_keys(self, lookup):
+        # A plain read: locking reads of missing rows would take gap locks
+        # that deadlock concurrent inserts under REPEATABLE READ
+        return set(Notification.objects.filter(lookup).values_list(
+            'recipient_id', 'verb', 'target_content_type_id', 'target_object_id'))
+
+    def write_batch(self, batch):
+        """
+        Write `batch`, retrying NOTIFICATION_WRITE_ATTEMPTS times on database
+        errors such as deadlocks between concurrent writers, so a transient
+        failure does not discard the whole batch.
+        """
+        attempts = settings.NOTIFICATION_WRITE_ATTEMPTS
+        for attempt in range(1, attempts + 1):
+            try:
+                return self.write(batch)
+            except DatabaseError:
+                if attempt == attempts:
+                    raise
+                logger.warning('Retrying %d notifications after a database error',
+                               len(batch), exc_info=True)
+                close_old_connections()
+                time.sleep(settings.NOTIFICATION_FLUSH_INTERVAL * attempt)
+
+    def _ensure_workers(self):
+        # Started lazily so each forked server process gets its own pool
+        if self._workers and all(w.is_alive() for w in self._workers):
+            return
+        with self._lock:
+            self._workers = [w for w in self._workers if w.is_alive()]
+            while len(self._workers) < settings.NOTIFICATION_WORKERS:
+                worker = threading.Thread(target=self._run, daemon=True,
+                                          name='notification-dispatcher')
+                worker.start()
+                self._workers.append(worker)
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + settings.NOTIFICATION_FLUSH_INTERVAL
+        while len(batch) < settings.NOTIFICATION_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                close_old_connections()
+                self.write_batch(batch)
+            except Exception:
+                logger.exception('Failed to write %d notifications', len(batch))
+            finally:
+                close_old_connections()
+                for _ in batch:
+                    self.queue.task_done()
+
+
+dispatcher = NotificationDispatcher()
+atexit.register(dispatcher.flush, timeout=5)
+
+
+def notify(recipient, actor, verb, target):
+    """
+    Queue a notification for `recipient` once the current transaction
+    commits. Users are never notified about their own actions.
+    """
+    if recipient.pk == actor.pk:
+        return
+    event = NotificationEvent(
+        recipient_id=recipient.pk,
+        actor_id=actor.pk,
+        verb=verb,
+        target_content_type_id=ContentType.objects.get_for_model(target).pk,
+        target_object_id=target.pk,
+        target_summary=str(target)[:255],
+    )
+    transaction.on_commit(lambda: dispatcher.enqueue(event))
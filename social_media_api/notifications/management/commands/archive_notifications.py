@@ -0,0 +1,66 @@
+# social_media_api/notifications/management/commands/archive_notifications.py
+
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from notifications.models import Notification, NotificationArchive
+
+ARCHIVED_FIELDS = ('id', 'recipient_id', 'verb', 'target_content_type_id',
+                   'target_object_id', 'target_summary', 'actor_count',
+                   'timestamp')
+
+
+class Command(BaseCommand):
+    help = ('Move read notifications older than the retention period into '
+            'the notification archive, in short batched transactions.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            default=settings.NOTIFICATION_RETENTION_DAYS,
+                            help='Archive read notifications older than this.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Rows moved per transaction.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches to limit load.')
+
+    def archive_batch(self, cutoff, batch_size):
+        """Move one batch; each batch holds its locks only briefly."""
+        with transaction.atomic():
+            # Locked so the dispatcher cannot reopen a grouped notification
+            # (unread, fresh timestamp) between the copy and the delete
+            rows = list(Notification.objects.select_for_update()
+                        .filter(is_read=True, timestamp__lt=cutoff)
+                        .order_by('timestamp', 'id')
+                        .values(*ARCHIVED_FIELDS)[:batch_size])
+            if not rows:
+                return 0
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive(**row) for row in rows],
+                ignore_conflicts=True)
+            Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+        return len(rows)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        started = time.monotonic()
+        moved = 0
+        while True:
+            batch_started = time.monotonic()
+            batch = self.archive_batch(cutoff, options['batch_size'])
+            if not batch:
+                break
+            moved += batch
+            if options['verbosity'] > 1:
+                elapsed = time.monotonic() - batch_started
+                self.stdout.write(f'Moved {batch} rows '
+                                  f'({batch / max(elapsed, 1e-6):.0f} rows/s)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Archived {moved} notifications in {elapsed:.1f}s '
+            f'({moved / max(elapsed, 1e-6):.0f} rows/s).'))
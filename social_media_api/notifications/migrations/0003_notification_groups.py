@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:43
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+GROUP_FIELDS = ('recipient_id', 'verb', 'target_content_type_id',
+                'target_object_id')
+
+
+def merge_notification_groups(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+
+    rows = Notification.objects.select_related('actor').order_by('id')
+    batch = []
+    for notification in rows.iterator(chunk_size=1000):
+        notification.latest_actors = [notification.actor.username]
+        batch.append(notification)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['latest_actors'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['latest_actors'])
+
+    duplicated = (Notification.objects.values(*GROUP_FIELDS)
+                  .annotate(rows=Count('id')).filter(rows__gt=1))
+    for group in duplicated.iterator():
+        members = list(Notification.objects.select_related('actor')
+                       .filter(**{field: group[field] for field in GROUP_FIELDS})
+                       .order_by('-timestamp', '-id'))
+        actors = list(dict.fromkeys(member.actor.username for member in members))
+        keep = members[0]
+        keep.actor_count = len(actors)
+        keep.latest_actors = actors[:settings.NOTIFICATION_LATEST_ACTORS]
+        keep.is_read = all(member.is_read for member in members)
+        keep.save(update_fields=['actor_count', 'latest_actors', 'is_read'])
+        Notification.objects.filter(
+            pk__in=[member.pk for member in members[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0002_keyset_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_count',
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='latest_actors',
+            field=models.JSONField(default=list),
+        ),
+        migrations.RunPython(merge_notification_groups,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(fields=('recipient', 'verb', 'target_content_type', 'target_object_id'), name='notif_group_unique'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.7 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def summarize(target):
+    # Historical models have no custom __str__; mirror Post and CustomUser
+    for field in ('title', 'username'):
+        if hasattr(target, field):
+            return getattr(target, field)[:255]
+    return str(target.pk)
+
+
+def placeholder(content_type, object_id):
+    # Deleted targets and removed models still get a non-empty summary
+    return f'{content_type.app_label}.{content_type.model} #{object_id}'
+
+
+def backfill_target_summaries(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+
+    content_type_ids = (Notification.objects.order_by()
+                        .values_list('target_content_type', flat=True).distinct())
+    for content_type in ContentType.objects.filter(pk__in=list(content_type_ids)):
+        try:
+            model = apps.get_model(content_type.app_label, content_type.model)
+        except LookupError:
+            model = None
+        last_id = 0
+        while True:
+            batch = list(Notification.objects
+                         .filter(target_content_type=content_type, id__gt=last_id)
+                         .order_by('id')[:BATCH_SIZE])
+            if not batch:
+                break
+            # One query per content type and batch resolves every target
+            targets = model._base_manager.in_bulk(
+                {notification.target_object_id for notification in batch}) if model else {}
+            for notification in batch:
+                target = targets.get(notification.target_object_id)
+                notification.target_summary = (
+                    summarize(target) if target
+                    else placeholder(content_type, notification.target_object_id))
+            Notification.objects.bulk_update(batch, ['target_summary'])
+            last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_unread_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='target_summary',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(backfill_target_summaries,
+                             migrations.RunPython.noop),
+    ]
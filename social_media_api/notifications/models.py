@@ -6,6 +6,18 @@ from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
 class Notification(models.Model):
+    """
+    A notification group: all activity of one kind (`verb`) on one target
+    for one recipient is folded into a single row, e.g. "alice and 42
+    others liked your post".
+
+    Attributes:
+        actor (ForeignKey): Most recent user to act on the target
+        actor_count (PositiveIntegerField): Number of users in the group
+        latest_actors (JSONField): Usernames of the most recent actors,
+            newest first, capped at NOTIFICATION_LATEST_ACTORS
+    """
+
     recipient = models.ForeignKey(settings.AUTH_USER_MODEL, 
                                   on_delete=models.CASCADE, 
                                   related_name='notifications')
@@ -16,8 +28,52 @@ class Notification(models.Model):
                                             on_delete=models.CASCADE)
     target_object_id = models.PositiveIntegerField()
     target = GenericForeignKey('target_content_type', 'target_object_id')
+    # Display text of the target captured when the notification is written,
+    # so listing notifications never has to resolve the generic relation
+    target_summary = models.CharField(max_length=255, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
+    actor_count = models.PositiveIntegerField(default=1)
+    latest_actors = models.JSONField(default=list)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'],
+                         name='notif_recipient_ts_idx'),
+            models.Index(fields=['recipient', 'is_read', 'timestamp'],
+                         name='notif_recipient_unread_idx'),
+            models.Index(fields=['is_read', 'timestamp'],
+                         name='notif_read_ts_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'verb', 'target_content_type',
+                        'target_object_id'],
+                name='notif_group_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.actor.username} {self.verb} {self.target}"
+
+class NotificationArchive(models.Model):
+    """
+    Compact copy of a read notification moved out of the live table by the
+    `archive_notifications` command. Keeps the original primary key so
+    repeated runs never archive a row twice.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(settings.AUTH_USER_MODEL,
+                                  on_delete=models.CASCADE,
+                                  related_name='archived_notifications')
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType,
+                                            on_delete=models.CASCADE)
+    target_object_id = models.PositiveIntegerField()
+    target_summary = models.CharField(max_length=255, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    timestamp = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.actor.username} {self.verb} {self.target}"
\ No newline at end of file
+        return f"{self.verb} {self.target_summary} (archived)"
\ No newline at end of file
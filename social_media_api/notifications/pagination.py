@@ -0,0 +1,8 @@
+# social_media_api/notifications/pagination.py
+
+from rest_framework.pagination import CursorPagination
+
+
+class NotificationCursorPagination(CursorPagination):
+    """Keyset pagination over (timestamp, id), newest first."""
+    ordering = ('-timestamp', '-id')
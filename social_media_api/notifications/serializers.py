@@ -6,10 +6,34 @@ from .models import Notification
 class NotificationSerializer(serializers.ModelSerializer):
     actor = serializers.ReadOnlyField(source='actor.username')
     target = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
-        fields = ['id', 'actor', 'verb', 'target', 'timestamp', 'is_read']
+        fields = ['id', 'actor', 'verb', 'target', 'timestamp', 'is_read',
+                  'actor_count', 'latest_actors', 'summary']
 
     def get_target(self, obj):
-        return str(obj.target)
\ No newline at end of file
+        # Snapshotted when the notification is written (and backfilled by
+        # migration 0005), so listing never resolves the generic relation
+        return obj.target_summary
+
+    def get_summary(self, obj):
+        # e.g. "Festus and 42 others liked your post"
+        lead = obj.latest_actors[0] if obj.latest_actors else obj.actor.username
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{lead} {obj.verb}"
+        noun = 'other' if others == 1 else 'others'
+        return f"{lead} and {others} {noun} {obj.verb}"
+
+class NotificationMarkReadSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False,
+                                allow_empty=False, max_length=1000)
+    before = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        if 'ids' not in attrs and 'before' not in attrs:
+            raise serializers.ValidationError(
+                "Provide a list of notification 'ids' or a 'before' timestamp.")
+        return attrs
@@ -1,3 +1,239 @@
-from django.test import TestCase
+from datetime import timedelta
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+from django.apps import apps
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.utils import timezone
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from rest_framework.test import APIClient
+from posts.models import Post
+from .dispatch import NotificationEvent, dispatcher
+from .models import Notification, NotificationArchive
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS_ASYNC=False)
+class NotificationDispatchTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.fan = User.objects.create_user(username='fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.client.force_authenticate(user=self.fan)
+
+    def test_like_comment_and_follow_notify_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+            self.client.post(reverse('comment-list'),
+                             {'post': self.post.pk, 'content': 'Nice'})
+            self.client.post(reverse('follow-user', kwargs={'user_id': self.author.id}))
+        self.assertEqual(
+            sorted(Notification.objects.filter(recipient=self.author)
+                   .values_list('verb', flat=True)),
+            ['commented on your post', 'liked your post', 'started following you'])
+
+    def test_own_actions_do_not_notify(self):
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_write_coalesces_duplicate_events(self):
+        event = NotificationEvent(
+            recipient_id=self.author.pk, actor_id=self.fan.pk, verb='liked your post',
+            target_content_type_id=ContentType.objects.get_for_model(Post).pk,
+            target_object_id=self.post.pk, target_summary=str(self.post))
+        self.assertEqual(dispatcher.write([event, event, event]), 1)
+        self.assertEqual(Notification.objects.count(), 1)
+
+    def like_event(self, actor):
+        return NotificationEvent(
+            recipient_id=self.author.pk, actor_id=actor.pk, verb='liked your post',
+            target_content_type_id=ContentType.objects.get_for_model(Post).pk,
+            target_object_id=self.post.pk, target_summary=str(self.post))
+
+    def test_write_merges_into_a_group_inserted_concurrently(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        dispatcher.write([self.like_event(other)])
+        # Another writer created the group after this batch looked for it
+        with mock.patch.object(dispatcher, '_existing_keys', return_value=set()):
+            self.assertEqual(dispatcher.write([self.like_event(self.fan)]), 1)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.latest_actors, ['fan', 'other'])
+
+    def test_write_recreates_a_group_archived_concurrently(self):
+        event = self.like_event(self.fan)
+        key = (event.recipient_id, event.verb, event.target_content_type_id,
+               event.target_object_id)
+        # The group existed when this batch looked, then was archived
+        with mock.patch.object(dispatcher, '_existing_keys', return_value={key}):
+            self.assertEqual(dispatcher.write([event]), 1)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor_count, notification.latest_actors),
+                         (1, ['fan']))
+
+    def test_deleted_actors_are_skipped(self):
+        gone = User.objects.create_user(username='gone', password='testpass123')
+        events = [self.like_event(self.fan), self.like_event(gone)]
+        gone.delete()
+        self.assertEqual(dispatcher.write(events), 1)
+        notification = Notification.objects.get()
+        self.assertEqual((notification.actor, notification.latest_actors),
+                         (self.fan, ['fan']))
+
+    @override_settings(NOTIFICATION_FLUSH_INTERVAL=0)
+    def test_failed_batches_are_retried(self):
+        write = dispatcher.write
+        calls = []
+
+        def flaky_write(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise OperationalError('Deadlock found when trying to get lock')
+            return write(batch)
+
+        # write_batch resets the worker's connection between attempts; keep
+        # the test case's own connection open
+        with mock.patch.object(dispatcher, 'write', side_effect=flaky_write), \
+                mock.patch('notifications.dispatch.close_old_connections') as close:
+            self.assertEqual(dispatcher.write_batch([self.like_event(self.fan)]), 1)
+        self.assertEqual(len(calls), 2)
+        close.assert_called_once_with()
+        self.assertTrue(Notification.objects.exists())
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS_ASYNC=False,
+                   NOTIFICATION_LATEST_ACTORS=2)
+class NotificationGroupingTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+
+    def like_as(self, username):
+        fan, _ = User.objects.get_or_create(username=username)
+        self.client.force_authenticate(user=fan)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+
+    def test_likes_on_one_post_are_folded_into_one_group(self):
+        for username in ('ama', 'kofi', 'esi'):
+            self.like_as(username)
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.latest_actors, ['esi', 'kofi'])
+
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.data['results'][0]['summary'],
+                         'esi and 2 others liked your post')
+
+    def test_new_activity_reopens_a_read_group(self):
+        self.like_as('ama')
+        Notification.objects.update(is_read=True)
+        self.like_as('kofi')
+        notification = Notification.objects.get()
+        self.assertFalse(notification.is_read)
+        self.assertEqual(notification.actor_count, 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class NotificationReadStateTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.actor = User.objects.create_user(username='actor', password='testpass123')
+        content_type = ContentType.objects.get_for_model(Post)
+        self.notifications = Notification.objects.bulk_create([
+            Notification(recipient=self.user, actor=self.actor, verb='liked your post',
+                         target_content_type=content_type, target_object_id=i)
+            for i in range(1, 6)
+        ])
+        self.client.force_authenticate(user=self.user)
+
+    def test_unread_count_is_cached_and_invalidated_by_mark_read(self):
+        url = reverse('notification-unread-count')
+        self.assertEqual(self.client.get(url).data['unread_count'], 5)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        ids = [n.id for n in self.notifications[:3]]
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('notification-bulk-mark-read'),
+                                        {'ids': ids}, format='json')
+        self.assertEqual(response.data['updated'], 3)
+        self.assertEqual(self.client.get(url).data['unread_count'], 2)
+
+    def test_mark_read_requires_ids_or_timestamp(self):
+        response = self.client.post(reverse('notification-bulk-mark-read'), {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_mark_read_only_accepts_post(self):
+        url = reverse('notification-mark-read', kwargs={'pk': self.notifications[0].pk})
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertTrue(Notification.objects.get(pk=self.notifications[0].pk).is_read)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, NOTIFICATIONS_ASYNC=False)
+class NotificationListQueryTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.client.force_authenticate(user=self.author)
+
+    def test_list_does_not_resolve_generic_targets(self):
+        for i in range(6):
+            post = Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+            fan = User.objects.create_user(username=f'fan{i}', password='testpass123')
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.force_authenticate(user=fan)
+                self.client.post(reverse('post-like', kwargs={'pk': post.pk}))
+
+        self.client.force_authenticate(user=self.author)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('notification-list'))
+        self.assertEqual(response.data['results'][0]['target'], 'Post 5')
+
+    def test_backfill_summarizes_deleted_targets_with_a_placeholder(self):
+        backfill = import_module('notifications.migrations.0005_notification_target_summary')
+        post = Post.objects.create(author=self.author, title='Kept', content='Content')
+        content_type = ContentType.objects.get_for_model(Post)
+        Notification.objects.bulk_create([
+            Notification(recipient=self.author, actor=self.author, verb='liked your post',
+                         target_content_type=content_type, target_object_id=object_id)
+            for object_id in (post.pk, post.pk + 1)
+        ])
+        backfill.backfill_target_summaries(apps, None)
+        self.assertEqual(
+            list(Notification.objects.order_by('id').values_list('target_summary', flat=True)),
+            ['Kept', f'posts.post #{post.pk + 1}'])
+
+
+class NotificationArchiveTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        content_type = ContentType.objects.get_for_model(Post)
+        Notification.objects.bulk_create([
+            Notification(recipient=self.user, actor=self.user, verb='liked your post',
+                         target_content_type=content_type, target_object_id=i,
+                         is_read=i % 2 == 0)
+            for i in range(1, 8)
+        ])
+        Notification.objects.update(timestamp=timezone.now() - timedelta(days=100))
+
+    def test_only_old_read_notifications_are_archived(self):
+        Notification.objects.filter(target_object_id=2).update(timestamp=timezone.now())
+        call_command('archive_notifications', days=90, batch_size=2, stdout=StringIO())
+        self.assertEqual(sorted(NotificationArchive.objects.values_list(
+            'target_object_id', flat=True)), [4, 6])
+        self.assertEqual(Notification.objects.count(), 5)
@@ -1,10 +1,15 @@
 # social_media_api/notifications/urls.py
 
 from django.urls import path
-from .views import NotificationListView, NotificationMarkReadView
+from .views import (NotificationListView, NotificationMarkReadView,
+                    NotificationBulkMarkReadView, NotificationUnreadCountView)
 
 urlpatterns = [
     path('', NotificationListView.as_view(), name='notification-list'),
     path('<int:pk>/mark-read/', NotificationMarkReadView.as_view(), 
          name='notification-mark-read'),
+    path('mark-read/', NotificationBulkMarkReadView.as_view(),
+         name='notification-bulk-mark-read'),
+    path('unread-count/', NotificationUnreadCountView.as_view(),
+         name='notification-unread-count'),
 ]
\ No newline at end of file
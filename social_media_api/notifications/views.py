@@ -2,28 +2,54 @@
 
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from .cache import get_unread_count, invalidate_unread_count
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationSerializer, NotificationMarkReadSerializer
+from .pagination import NotificationCursorPagination
 
 class NotificationListView(generics.ListAPIView):
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
 
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user).order_by('-timestamp')
+        return (Notification.objects.filter(recipient=self.request.user)
+                .select_related('actor').order_by('-timestamp', '-id'))
 
-class NotificationMarkReadView(generics.UpdateAPIView):
-    queryset = Notification.objects.all()
-    serializer_class = NotificationSerializer
+class NotificationMarkReadView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
-    def get(self, request, *args, **kwargs):
-        notification = Notification.objects.filter(id=kwargs['pk'], recipient=request.user).first()
-        if notification:
-            notification.is_read = True
-            notification.save()
+    def post(self, request, pk):
+        updated = (Notification.objects
+                   .filter(id=pk, recipient=request.user)
+                   .update(is_read=True))
+        if updated:
+            invalidate_unread_count(request.user.pk)
             return Response({'status': 'notification marked as read'})
         return Response({'status': 'notification not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    def post(self, request, *args, **kwargs):
-        return self.get(request, *args, **kwargs)
\ No newline at end of file
+# Mark many notifications as read with a single UPDATE
+class NotificationBulkMarkReadView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = NotificationMarkReadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        notifications = Notification.objects.filter(recipient=request.user,
+                                                    is_read=False)
+        if 'ids' in serializer.validated_data:
+            notifications = notifications.filter(id__in=serializer.validated_data['ids'])
+        if 'before' in serializer.validated_data:
+            notifications = notifications.filter(
+                timestamp__lte=serializer.validated_data['before'])
+        updated = notifications.update(is_read=True)
+        invalidate_unread_count(request.user.pk)
+        return Response({'status': 'notifications marked as read',
+                         'updated': updated})
+
+class NotificationUnreadCountView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        return Response({'unread_count': get_unread_count(request.user)})
\ No newline at end of file
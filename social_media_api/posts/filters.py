@@ -0,0 +1,17 @@
+# social_media_api/posts/filters.py
+
+from rest_framework import filters
+from .search import get_search_backend
+
+
+class PostSearchFilter(filters.SearchFilter):
+    """
+    `?search=` filter that delegates matching and relevance ranking to the
+    configured post search backend instead of LIKE '%term%' scans.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+        return get_search_backend().search(queryset, ' '.join(terms))
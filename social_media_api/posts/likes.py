@@ -0,0 +1,242 @@
+# social_media_api/posts/likes.py
+
+import atexit
+import logging
+import threading
+import time
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Exists, F, OuterRef
+from notifications.dispatch import NotificationEvent, dispatcher
+from .models import Like, Post, likes_changed
+
+logger = logging.getLogger(__name__)
+
+
+# Seconds a user's like/unlike of one post holds the shared-cache lock that
+# serializes their concurrent taps, and the longest a tap waits for it; the
+# critical section takes milliseconds
+CHANGE_LOCK_TIMEOUT = 2
+
+
+def _pending_key(post_id, user_id):
+    return f'likes:pending:{post_id}:{user_id}'
+
+
+def _lock_key(post_id, user_id):
+    return f'likes:lock:{post_id}:{user_id}'
+
+
+class LikeBuffer:
+    """
+    Write-behind buffer for likes (LIKE_WRITE_BEHIND).
+
+    Like and unlike requests only record the user's latest choice per post
+    in process memory, plus a marker in the shared cache so the user reads
+    their own writes from any process. A background thread flushes the
+    buffer every LIKE_FLUSH_INTERVAL seconds: new likes are written with
+    bulk_create, removed ones with one delete, and each post's likes_count
+    is adjusted by a single UPDATE, so a hot post costs a few statements per
+    interval instead of several per like. Counters of buffered likes lag by
+    up to one interval.
+
+    A user's taps may land on different processes, whose buffers flush in
+    any order. The shared marker always holds the user's last tap, so a
+    flush only writes changes that still agree with it and leaves the rest
+    to the process that recorded the newer tap.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._worker = None
+
+    def record(self, user_id, post_id, liked):
+        with self._lock:
+            self._pending.setdefault(post_id, {})[user_id] = liked
+        cache.set(_pending_key(post_id, user_id), liked, settings.LIKE_PENDING_TTL)
+        self._ensure_worker()
+
+    def change(self, user_id, post_id, liked):
+        """
+        Record `liked` unless it already is the user's state. Returns True if
+        it changed, False if not, and None if there is no such post.
+
+        The state comes from the shared marker when there is one, so repeat
+        taps cost no queries; otherwise one query reads the post and the
+        stored like together. The check and the record run under a per-user,
+        per-post lock in the shared cache, so concurrent taps from one user,
+        on any process, change the state once. The wait for the lock is
+        bounded by its timeout, after which a crashed holder's lock has
+        expired anyway.
+        """
+        lock_key = _lock_key(post_id, user_id)
+        deadline = time.monotonic() + CHANGE_LOCK_TIMEOUT
+        locked = cache.add(lock_key, True, CHANGE_LOCK_TIMEOUT)
+        while not locked and time.monotonic() < deadline:
+            time.sleep(0.005)
+            locked = cache.add(lock_key, True, CHANGE_LOCK_TIMEOUT)
+        try:
+            state = self.pending_states(user_id, [post_id]).get(post_id)
+            if state is None:
+                state = (Post.objects.filter(pk=post_id)
+                         .annotate(liked=Exists(Like.objects.filter(
+                             post=OuterRef('pk'), user_id=user_id)))
+                         .values_list('liked', flat=True).first())
+                if state is None:
+                    return None
+            if state == liked:
+                return False
+            self.record(user_id, post_id, liked)
+            return True
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    def pending_states(self, user_id, post_ids):
+        """Post id -> True/False for posts with an unflushed like or unlike."""
+        keys = {_pending_key(post_id, user_id): post_id for post_id in post_ids}
+        return {keys[key]: liked for key, liked in cache.get_many(keys).items()}
+
+    def flush(self):
+        """Write everything buffered so far. Returns the number of posts touched."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if pending:
+                self._write(pending)
+            return len(pending)
+
+    def _write(self, pending):
+        posts = {pk: (author_id, title) for pk, author_id, title in
+                 Post.objects.filter(pk__in=pending)
+                 .values_list('pk', 'author_id', 'title')}
+        content_type_id = ContentType.objects.get_for_model(Post).pk
+        batch_size = settings.LIKE_FLUSH_BATCH_SIZE
+        events = []
+        changed = []
+        for post_id, changes in pending.items():
+            if post_id not in posts:
+                continue  # deleted since it was liked
+            try:
+                with transaction.atomic():
+                    # Lock the post row before the inserts take shared
+                    # (foreign key) locks on it; see PostViewSet.like(). The
+                    # lock also serializes flushes of one post across
+                    # processes, so the markers read below stay current
+                    list(Post.objects.select_for_update().filter(pk=post_id).values_list('pk'))
+                    current = self.current_changes(post_id, changes)
+                    liked = [user_id for user_id, state in current.items() if state]
+                    unliked = [user_id for user_id, state in current.items() if not state]
+                    added = self._insert(post_id, liked, batch_size)
+                    removed = 0
+                    for start in range(0, len(unliked), batch_size):
+                        removed += Like.objects.filter(
+                            post_id=post_id,
+                            user_id__in=unliked[start:start + batch_size]).delete()[0]
+                    delta = len(added) - removed
+                    if delta > 0:
+                        Post.objects.filter(pk=post_id).update(
+                            likes_count=F('likes_count') + delta)
+                    elif delta < 0:
+                        Post.objects.filter(pk=post_id).decrement_counter(
+                            'likes_count', -delta)
+            except Exception:
+                logger.exception('Failed to flush %d like changes for post %s; '
+                                 'retrying on the next flush', len(changes), post_id)
+                self._requeue(post_id, changes)
+                continue
+            if added or removed:
+                changed.append(post_id)
+            author_id, title = posts[post_id]
+            events.extend(
+                NotificationEvent(recipient_id=author_id, actor_id=user_id,
+                                  verb='liked your post',
+                                  target_content_type_id=content_type_id,
+                                  target_object_id=post_id,
+                                  target_summary=title[:255])
+                for user_id in added if user_id != author_id)
+        if changed:
+            likes_changed.send(sender=Like, post_ids=changed)
+        if events:
+            dispatcher.enqueue_many(events)
+
+    def current_changes(self, post_id, changes):
+        """
+        The subset of `changes` (user id -> liked) that still matches each
+        user's last tap. A change overtaken by a newer tap recorded on
+        another process is dropped; that process writes the newer one.
+        """
+        keys = {_pending_key(post_id, user_id): user_id for user_id in changes}
+        latest = {keys[key]: liked for key, liked in cache.get_many(keys).items()}
+        return {user_id: liked for user_id, liked in changes.items()
+                if latest.get(user_id, liked) == liked}
+
+    def _requeue(self, post_id, changes):
+        # Choices recorded since the flush started are newer and win
+        with self._lock:
+            pending = self._pending.setdefault(post_id, {})
+            requeued = {user_id: liked for user_id, liked in changes.items()
+                        if pending.setdefault(user_id, liked) == liked}
+        # Keep reading them back until they are written
+        cache.set_many({_pending_key(post_id, user_id): liked
+                        for user_id, liked in requeued.items()},
+                       settings.LIKE_PENDING_TTL)
+
+    def _insert(self, post_id, user_ids, batch_size):
+        """Insert likes not already stored; returns the user ids added."""
+        added = []
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            existing = set(Like.objects.filter(post_id=post_id, user_id__in=chunk)
+                           .values_list('user_id', flat=True))
+            new = [user_id for user_id in chunk if user_id not in existing]
+            Like.objects.bulk_create(
+                [Like(post_id=post_id, user_id=user_id) for user_id in new],
+                ignore_conflicts=True)
+            added.extend(new)
+        return added
+
+    def _ensure_worker(self):
+        # LIKE_FLUSH_INTERVAL = 0 leaves flushing to explicit flush() calls
+        if not settings.LIKE_FLUSH_INTERVAL:
+            return
+        # Started lazily so each forked server process gets its own flusher
+        if self._worker and self._worker.is_alive():
+            return
+        with self._lock:
+            if not (self._worker and self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, daemon=True,
+                                                name='like-flusher')
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(settings.LIKE_FLUSH_INTERVAL)
+            try:
+                close_old_connections()
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush buffered likes')
+            finally:
+                close_old_connections()
+
+
+like_buffer = LikeBuffer()
+atexit.register(like_buffer.flush)
+
+
+def apply_pending_likes(user, posts):
+    """
+    Overlay `user`'s unflushed likes and unlikes onto the `is_liked` flags of
+    `posts` with one cache lookup, so write-behind likes read back at once.
+    """
+    if not (settings.LIKE_WRITE_BEHIND and user.is_authenticated and posts):
+        return
+    pending = like_buffer.pending_states(user.pk, [post.pk for post in posts])
+    for post in posts:
+        if post.pk in pending:
+            post.is_liked = pending[post.pk]
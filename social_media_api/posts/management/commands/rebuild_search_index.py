@@ -0,0 +1,23 @@
+# social_media_api/posts/management/commands/rebuild_search_index.py
+
+import time
+from django.core.management.base import BaseCommand
+from posts.search import InvertedIndexBackend, get_search_backend
+
+
+class Command(BaseCommand):
+    help = ('Rebuild the in-process post search index from the database and '
+            'save it to POST_SEARCH_INDEX_PATH. Database full-text backends '
+            'maintain their own index and need no rebuild.')
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        if not isinstance(backend, InvertedIndexBackend):
+            self.stdout.write(f'{type(backend).__name__} keeps its own index; nothing to do.')
+            return
+        started = time.monotonic()
+        backend.rebuild()
+        backend.save()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {len(backend.documents)} posts ({len(backend.postings)} terms) '
+            f'in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,24 @@
+# social_media_api/posts/management/commands/rebuild_timelines.py
+
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from posts.timeline import fan_out_post
+
+
+class Command(BaseCommand):
+    help = ('Fan existing posts out into the materialized home timelines. '
+            'Safe to re-run: entries that already exist are skipped.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of posts loaded per query.')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        posts = Post.objects.select_related('author').order_by('id')
+        processed = delivered = 0
+        for post in posts.iterator(chunk_size=batch_size):
+            delivered += fan_out_post(post)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Fanned out {processed} posts into {delivered} timeline entries.'))
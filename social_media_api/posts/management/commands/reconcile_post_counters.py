@@ -0,0 +1,13 @@
+# social_media_api/posts/management/commands/reconcile_post_counters.py
+
+from posts.models import Post, Like, Comment
+from social_media_api.counters import ReconcileCountersCommand
+
+
+class Command(ReconcileCountersCommand):
+    help = ('Recount likes and comments per post and repair drifted '
+            'denormalized counters, one batch of posts at a time.')
+
+    model = Post
+    counters = {'likes_count': (Like, 'post'), 'comments_count': (Comment, 'post')}
+    noun = 'posts'
@@ -0,0 +1,41 @@
+# social_media_api/posts/management/commands/trim_timelines.py
+
+import time
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts.timeline import trim_timeline
+
+
+class Command(BaseCommand):
+    help = ('Trim every materialized home timeline to its newest '
+            'FEED_TIMELINE_MAX_ENTRIES entries, one batch of users at a time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--length', type=int, default=None,
+                            help='Entries kept per timeline '
+                                 '(default: FEED_TIMELINE_MAX_ENTRIES).')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of users handled per batch.')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Seconds to pause between batches.')
+
+    def handle(self, *args, **options):
+        length = options['length']
+        if length is None:
+            length = settings.FEED_TIMELINE_MAX_ENTRIES
+        users = get_user_model().objects.order_by('pk').values_list('pk', flat=True)
+        started = time.monotonic()
+        last_id, trimmed = 0, 0
+        while True:
+            user_ids = list(users.filter(pk__gt=last_id)[:options['batch_size']])
+            if not user_ids:
+                break
+            for user_id in user_ids:
+                trimmed += trim_timeline(user_id, length)
+            last_id = user_ids[-1]
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Trimmed {trimmed} timeline entries in '
+            f'{time.monotonic() - started:.1f}s.'))
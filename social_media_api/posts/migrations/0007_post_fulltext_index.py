@@ -0,0 +1,25 @@
+from django.db import migrations
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Only MySQL has FULLTEXT indexes; other databases search through the
+    # in-process inverted index (see posts.search)
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute(
+            'CREATE FULLTEXT INDEX post_title_content_ft ON posts_post (title, content)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX post_title_content_ft ON posts_post')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
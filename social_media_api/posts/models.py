@@ -1,7 +1,62 @@
 # social_media_api/posts/models.py
 
-from django.db import models
+from django.db import connections, models
+from django.db.models import Exists, Max, OuterRef, Prefetch, Subquery, Value
+from django.db.models.constants import OnConflict
 from django.conf import settings
+from django.dispatch import Signal
+from django.utils import timezone
+from social_media_api.counters import decremented
+
+# Sent with `post_ids` after likes are written with raw SQL or in bulk,
+# which bypasses post_save and post_delete
+likes_changed = Signal()
+
+class PostQuerySet(models.QuerySet):
+    def with_related(self):
+        """
+        Load everything PostSerializer renders in a fixed number of queries:
+        the author is joined and the latest POST_COMMENT_PREVIEW_SIZE
+        comments of each post (with their authors) are prefetched in one
+        query into `latest_comments`. Like and comment counts are columns.
+        """
+        return (self.select_related('author')
+                .prefetch_related(Prefetch('comments',
+                                           queryset=Comment.objects.latest_preview(),
+                                           to_attr='latest_comments')))
+
+    def with_like_state(self, user):
+        """
+        Annotate `is_liked`, whether `user` likes each post, as an EXISTS
+        subquery of the posts query itself rather than a query per post.
+        """
+        if not user.is_authenticated:
+            return self.annotate(is_liked=Value(False))
+        return self.annotate(is_liked=Exists(
+            Like.objects.filter(user=user, post=OuterRef('pk'))))
+
+    def decrement_counter(self, field, amount=1):
+        """Subtract `amount` from a denormalized counter, stopping at 0."""
+        return self.update(**{field: decremented(field, amount)})
+
+    def versions(self, user, *fields):
+        """
+        Cheap probe of what PostSerializer would render for `user`: the
+        post's timestamps, counters, author name and like state, plus the
+        newest comment edit (comment additions and deletions already move
+        comments_count), and any extra `fields` a paginator needs. One
+        query, no prefetch; used to compute ETags.
+        """
+        # A correlated subquery rather than a join + GROUP BY, which would
+        # make the database sort instead of reading the ordering index
+        newest_edit = (Comment.objects.filter(post=OuterRef('pk'))
+                       .values('post').annotate(newest=Max('updated_at'))
+                       .values('newest'))
+        return (self.with_like_state(user)
+                .annotate(comments_updated_at=Subquery(newest_edit))
+                .values('id', 'created_at', 'updated_at', 'likes_count',
+                        'comments_count', 'comments_updated_at',
+                        'author__username', 'is_liked', *fields))
 
 # Post model
 class Post(models.Model):
@@ -11,10 +66,30 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, maintained with F() updates by the like/unlike
+    # and comment endpoints and repaired by `reconcile_post_counters`
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'],
+                         name='post_created_id_idx'),
+            models.Index(fields=['author', '-created_at', '-id'],
+                         name='post_author_created_idx'),
+        ]
     
     def __str__(self):
         return self.title
 
+class CommentQuerySet(models.QuerySet):
+    def latest_preview(self):
+        """Newest POST_COMMENT_PREVIEW_SIZE comments, with their authors."""
+        return (self.select_related('author')
+                .order_by('-created_at', '-id')[:settings.POST_COMMENT_PREVIEW_SIZE])
+
 # Comment model 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, 
@@ -26,17 +101,104 @@ class Comment(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at', 'id'],
+                         name='comment_post_created_idx'),
+        ]
+
     def __str__(self):
         return f'Comment by {self.author} on {self.post}'
 
 # Like model  
+class LikeQuerySet(models.QuerySet):
+    def _execute(self, sql, params):
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def add(self, user, post_id):
+        """
+        Like post `post_id` as `user` with a single INSERT ... SELECT that
+        skips duplicates (INSERT IGNORE / ON CONFLICT DO NOTHING) and missing
+        posts. Returns True if a like was added.
+        """
+        connection = connections[self.db]
+        ops, meta = connection.ops, self.model._meta
+        quote = ops.quote_name
+        columns = ', '.join(quote(meta.get_field(name).column)
+                            for name in ('user', 'post', 'created_at'))
+        post_pk = quote(Post._meta.pk.column)
+        sql = (f'{ops.insert_statement(on_conflict=OnConflict.IGNORE)} '
+               f'{quote(meta.db_table)} ({columns}) '
+               f'SELECT %s, {post_pk}, %s FROM {quote(Post._meta.db_table)} '
+               f'WHERE {post_pk} = %s '
+               f'{ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}')
+        created_at = meta.get_field('created_at').get_db_prep_value(
+            timezone.now(), connection)
+        created = self._execute(sql, [user.pk, created_at, post_id]) == 1
+        if created:
+            likes_changed.send(sender=self.model, post_ids=[post_id])
+        return created
+
+    def remove(self, user, post_id):
+        """
+        Unlike post `post_id` as `user` with a single DELETE, bypassing the
+        collector. Returns True if a like was removed.
+        """
+        ops, meta = connections[self.db].ops, self.model._meta
+        quote = ops.quote_name
+        sql = (f'DELETE FROM {quote(meta.db_table)} '
+               f'WHERE {quote(meta.get_field("user").column)} = %s '
+               f'AND {quote(meta.get_field("post").column)} = %s')
+        deleted = self._execute(sql, [user.pk, post_id]) == 1
+        if deleted:
+            likes_changed.send(sender=self.model, post_ids=[post_id])
+        return deleted
+
+
 class Like(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     post = models.ForeignKey('Post', on_delete=models.CASCADE, related_name='likes')
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = LikeQuerySet.as_manager()
+
+    class Meta:
+        unique_together = ('user', 'post')
+
+    def __str__(self):
+        return f"{self.user.username} likes {self.post.title}"
+
+# Timeline entry model
+class TimelineEntry(models.Model):
+    """
+    Materialized home timeline row, written when a post is fanned out to
+    the followers of its author.
+
+    Attributes:
+        user (ForeignKey): Follower whose feed contains the post
+        post (ForeignKey): Post delivered to the feed
+        created_at (DateTimeField): Copy of the post's creation time so the
+            feed can be read with a single (user, created_at, post) range
+            scan; the feed orders and paginates on these columns
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    created_at = models.DateTimeField()
+
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'],
+                         name='timeline_user_created_post_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} likes {self.post.title}"
\ No newline at end of file
+        return f"{self.post.title} in {self.user.username}'s feed"
\ No newline at end of file
@@ -0,0 +1,35 @@
+# social_media_api/posts/pagination.py
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class PostCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (created_at, id), newest first. Every page is an
+    index range scan from the cursor position and no COUNT(*) is issued,
+    so deep pages cost the same as the first one.
+    """
+    ordering = ('-created_at', '-id')
+
+
+class FeedCursorPagination(CursorPagination):
+    """
+    Keyset pagination of the home feed over its timeline entries'
+    (created_at, post), newest first, as annotated by feed_queryset(): an
+    index range scan of the reader's timeline with no sort.
+    """
+    ordering = ('-feed_created_at', '-feed_post_id')
+
+
+class CommentCursorPagination(CursorPagination):
+    """Keyset pagination over a post's comments, oldest first."""
+    ordering = ('created_at', 'id')
+
+
+class PostSearchPagination(PageNumberPagination):
+    """
+    Search results are ordered by relevance rather than by a unique key,
+    so they are paged by number; the search backends cap how many
+    results are ranked.
+    """
+    page_size = 10
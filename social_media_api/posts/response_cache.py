@@ -0,0 +1,100 @@
+# social_media_api/posts/response_cache.py
+
+import hashlib
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+from social_media_api.conditional import conditional_get
+
+EPOCH_KEY = 'posts:response:epoch'
+LIST_VERSION_KEY = 'posts:response:list'
+
+
+def _post_version_key(post_id):
+    return f'posts:response:post:{post_id}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+class PostResponseCache:
+    """
+    Cache of rendered anonymous post list, detail and search responses.
+
+    Entries are keyed by the versions of what they show: list and search
+    pages by the list version, a post's detail by that post's version, and
+    everything by a global epoch. Writes (see posts.signals) replace the
+    affected versions once their transaction commits, so stale entries are
+    never read again and simply age out after POST_RESPONSE_CACHE_TTL. A
+    version key missing from the cache gets a fresh random value rather
+    than a counter reset, so eviction cannot bring old entries back.
+
+    Likes and comments only replace their post's version: on a busy site
+    they would otherwise empty every list and search page many times a
+    second. List pages may therefore show counters and comment previews up
+    to POST_RESPONSE_CACHE_TTL old; what is listed, and the posts' own
+    content, is always current.
+    """
+
+    def _versions(self, keys):
+        versions = cache.get_many(keys)
+        for key in keys:
+            if key not in versions:
+                version = _new_version()
+                if not cache.add(key, version, None):
+                    version = cache.get(key, version)
+                versions[key] = version
+        return [versions[key] for key in keys]
+
+    def key(self, request, post_id=None):
+        """Cache key of `request`'s response, or None if it is not cached."""
+        if not settings.POST_RESPONSE_CACHE_TTL or request.user.is_authenticated:
+            return None
+        version_key = LIST_VERSION_KEY if post_id is None else _post_version_key(post_id)
+        versions = self._versions([EPOCH_KEY, version_key])
+        # The absolute URL covers the query string and the hosts of the
+        # pagination links
+        url = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        return 'posts:response:{}:{}:{}'.format(*versions, url)
+
+    def respond(self, request, render, post_id=None):
+        """
+        Serve `request` from the cache, or call `render()` and cache its
+        data (and ETag) when it succeeds. Data is cached before content
+        negotiation, so every renderer can use it.
+        """
+        key = self.key(request, post_id)
+        if key is None:
+            return render()
+        cached = cache.get(key)
+        if cached is not None:
+            data, etag = cached
+            if etag is None:
+                return Response(data)
+            return conditional_get(request, etag, lambda: Response(data))
+        response = render()
+        if response.status_code == 200:
+            cache.set(key, (response.data, response.get('ETag')),
+                      settings.POST_RESPONSE_CACHE_TTL)
+        return response
+
+    def invalidate(self, post_ids=(), lists=False, everything=False):
+        """
+        Drop the cached detail responses of `post_ids`, plus all list and
+        search pages if `lists`, or every cached response, once the current
+        transaction commits so no reader can cache the old rows under the
+        new version.
+        """
+        keys = list(map(_post_version_key, post_ids))
+        if lists:
+            keys.append(LIST_VERSION_KEY)
+        if everything:
+            keys.append(EPOCH_KEY)
+        transaction.on_commit(
+            lambda: cache.set_many({key: _new_version() for key in keys}, None))
+
+
+response_cache = PostResponseCache()
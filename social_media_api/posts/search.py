@@ -0,0 +1,342 @@
+# social_media_api/posts/search.py
+
+import atexit
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from operator import itemgetter
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Case, F, FloatField, Func, Q, Value, When
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Post
+from .response_cache import response_cache
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class MatchAgainst(Func):
+    """MySQL `MATCH (columns) AGAINST (query)` relevance expression."""
+
+    template = 'MATCH (%(expressions)s) AGAINST (%(query)s IN NATURAL LANGUAGE MODE)'
+    output_field = FloatField()
+
+    def __init__(self, *columns, query):
+        super().__init__(*columns)
+        self.query = query
+
+    def as_sql(self, compiler, connection, **extra_context):
+        sql, params = super().as_sql(compiler, connection, query='%s', **extra_context)
+        return sql, (*params, self.query)
+
+
+class MySQLFullTextBackend:
+    """
+    Ranks posts with MySQL's natural-language full-text search over the
+    post_title_content_ft FULLTEXT index (see migration 0007).
+    """
+
+    def search(self, queryset, query):
+        relevance = MatchAgainst(F('title'), F('content'), query=query)
+        return (queryset.annotate(relevance=relevance)
+                .filter(relevance__gt=0)
+                .order_by('-relevance', '-id'))
+
+
+class InvertedIndexBackend:
+    """
+    Portable in-process inverted index ranked with BM25, for databases
+    without full-text search (SQLite in development and tests).
+
+    Each term maps to {post_id: term frequency}, so a search only touches the
+    postings of its own terms. Title terms count twice. The first search in a
+    process starts a daemon thread that loads the index from
+    POST_SEARCH_INDEX_PATH (or builds it from the database), catches it up
+    with posts changed since it was saved, and from then on writes it back
+    every POST_SEARCH_INDEX_SAVE_INTERVAL seconds; until it is loaded,
+    searches fall back to case-insensitive matching in the database. With
+    POST_SEARCH_INDEX_ASYNC disabled (e.g. in tests) the index is loaded and
+    saved inline instead. The post_save/post_delete signals in posts.signals
+    keep it current, including while it loads. Changes made by other
+    processes are only picked up when the index is next loaded, so this
+    backend suits single-process deployments.
+    """
+
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._worker = None
+        self.loaded = False
+        self.postings = {}
+        self.documents = {}
+        self.total_length = 0
+        self.snapshot_at = None
+        # Post id -> (title, content), or None once deleted, for changes
+        # made while a load or rebuild reads the database
+        self._changes = None
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    # Index maintenance
+
+    def _add(self, post_id, title, content):
+        self._remove(post_id)
+        terms = Counter(tokenize(title) * 2 + tokenize(content))
+        for term, frequency in terms.items():
+            self.postings.setdefault(term, {})[post_id] = frequency
+        length = sum(terms.values())
+        self.documents[post_id] = (length, tuple(terms))
+        self.total_length += length
+
+    def _remove(self, post_id):
+        document = self.documents.pop(post_id, None)
+        if document is None:
+            return
+        length, terms = document
+        self.total_length -= length
+        for term in terms:
+            postings = self.postings[term]
+            del postings[post_id]
+            if not postings:
+                del self.postings[term]
+
+    def _index_posts(self, queryset):
+        posts = queryset.order_by().values_list('pk', 'title', 'content')
+        for post_id, title, content in posts.iterator(chunk_size=2000):
+            self._add(post_id, title, content)
+
+    def rebuild(self):
+        """Replace the index with one built from the database."""
+        with self._load_lock:
+            self._install(self._read(saved=False))
+
+    def ensure_loaded(self):
+        """Load (or build) the index in this thread unless it already is."""
+        if self.loaded:
+            return
+        with self._load_lock:
+            if not self.loaded:
+                self._install(self._read(saved=True))
+
+    def _read(self, saved):
+        # Searches and signal handlers keep running against the current
+        # state; changes they make meanwhile are replayed by _install()
+        with self._lock:
+            self._changes = {}
+        try:
+            staging = type(self)()
+            staging.snapshot_at = timezone.now()
+            if not (saved and staging._load()):
+                staging._index_posts(Post.objects.all())
+        except BaseException:
+            with self._lock:
+                self._changes = None
+            raise
+        return staging
+
+    def _install(self, staging):
+        with self._lock:
+            self.postings, self.documents = staging.postings, staging.documents
+            self.total_length, self.snapshot_at = staging.total_length, staging.snapshot_at
+            for post_id, post in self._changes.items():
+                if post is None:
+                    self._remove(post_id)
+                else:
+                    self._add(post_id, *post)
+            self._changes = None
+            self.loaded = True
+            self._dirty = True
+        # Drop search pages cached while searches fell back to the database
+        response_cache.invalidate(lists=True)
+
+    def _load(self):
+        path = settings.POST_SEARCH_INDEX_PATH
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding='utf-8') as handle:
+                state = json.load(handle)
+            # JSON object keys are strings; post ids are restored to ints
+            postings = {term: {int(post_id): frequency
+                               for post_id, frequency in postings.items()}
+                        for term, postings in state['postings'].items()}
+            documents = {int(post_id): (length, tuple(terms))
+                         for post_id, (length, terms) in state['documents'].items()}
+            total_length = int(state['total_length'])
+            saved_at = datetime.fromisoformat(state['snapshot_at'])
+        except Exception:
+            logger.exception('Ignoring unreadable search index at %s', path)
+            return False
+        self.postings, self.documents, self.total_length = postings, documents, total_length
+        # Catch up with posts edited or deleted since the snapshot
+        self._index_posts(Post.objects.filter(updated_at__gte=saved_at))
+        existing = set(Post.objects.values_list('pk', flat=True).iterator(chunk_size=10000))
+        for post_id in set(self.documents) - existing:
+            self._remove(post_id)
+        return True
+
+    def save(self):
+        path = settings.POST_SEARCH_INDEX_PATH
+        if not path:
+            return
+        with self._lock:
+            if not (self.loaded and self._dirty):
+                return
+            # JSON rather than pickle: loading a planted or tampered file
+            # must not be able to run code in the app process
+            state = {'postings': self.postings, 'documents': self.documents,
+                     'total_length': self.total_length,
+                     'snapshot_at': self.snapshot_at.isoformat()}
+            directory = os.path.dirname(os.path.abspath(path))
+            descriptor, temporary = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(descriptor, 'w', encoding='utf-8') as handle:
+                json.dump(state, handle, separators=(',', ':'))
+            os.replace(temporary, path)
+            self._dirty = False
+            self._saved_at = time.monotonic()
+
+    def _changed(self):
+        self._dirty = True
+        # The worker saves on its own schedule
+        if (not settings.POST_SEARCH_INDEX_ASYNC and time.monotonic() - self._saved_at
+                >= settings.POST_SEARCH_INDEX_SAVE_INTERVAL):
+            self.save()
+
+    def index(self, post):
+        with self._lock:
+            if self._changes is not None:
+                self._changes[post.pk] = (post.title, post.content)
+            if self.loaded:
+                self._add(post.pk, post.title, post.content)
+                self._changed()
+
+    def remove(self, post_id):
+        with self._lock:
+            if self._changes is not None:
+                self._changes[post_id] = None
+            if self.loaded:
+                self._remove(post_id)
+                self._changed()
+
+    def start_loading(self):
+        """Load the index, then keep saving it, on a daemon worker thread."""
+        # Started lazily so each forked server process gets its own worker
+        if self._worker and self._worker.is_alive():
+            return
+        with self._lock:
+            if not (self._worker and self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, daemon=True,
+                                                name='search-indexer')
+                self._worker.start()
+
+    def _run(self):
+        try:
+            close_old_connections()
+            self.ensure_loaded()
+        except Exception:
+            # The next search starts another worker
+            logger.exception('Failed to load the search index')
+            return
+        finally:
+            close_old_connections()
+        while True:
+            time.sleep(settings.POST_SEARCH_INDEX_SAVE_INTERVAL)
+            try:
+                self.save()
+            except Exception:
+                logger.exception('Failed to save the search index')
+
+    # Querying
+
+    def rank(self, query, limit):
+        """Return up to `limit` (post_id, score) pairs, best first."""
+        with self._lock:
+            if not self.documents:
+                return []
+            count = len(self.documents)
+            average_length = self.total_length / count
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self.postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for post_id, frequency in postings.items():
+                    length = self.documents[post_id][0]
+                    norm = self.k1 * (1 - self.b + self.b * length / average_length)
+                    scores[post_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        return heapq.nlargest(limit, scores.items(), key=itemgetter(1))
+
+    def search(self, queryset, query):
+        if not self.loaded:
+            if settings.POST_SEARCH_INDEX_ASYNC:
+                self.start_loading()
+                return self._match(queryset, query)
+            self.ensure_loaded()
+        ranked = self.rank(query, settings.POST_SEARCH_MAX_RESULTS)
+        if not ranked:
+            return queryset.none()
+        relevance = Case(*[When(pk=post_id, then=Value(score))
+                           for post_id, score in ranked],
+                         default=Value(0.0), output_field=FloatField())
+        return (queryset.filter(pk__in=[post_id for post_id, _ in ranked])
+                .annotate(relevance=relevance)
+                .order_by('-relevance', '-id'))
+
+    def _match(self, queryset, query):
+        # Every term in the title or content, newest first, as the default
+        # SearchFilter would
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(content__icontains=term))
+        return queryset.order_by('-id')
+
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Return the shared instance of POST_SEARCH_BACKEND (a dotted path), or
+    when it is unset, full-text search on MySQL and the inverted index on
+    any other database.
+    """
+    path = settings.POST_SEARCH_BACKEND
+    if path is None:
+        path = ('posts.search.MySQLFullTextBackend' if connection.vendor == 'mysql'
+                else 'posts.search.InvertedIndexBackend')
+    backend = _backends.get(path)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.setdefault(path, import_string(path)())
+    return backend
+
+
+def _save_indexes():
+    for backend in list(_backends.values()):
+        if isinstance(backend, InvertedIndexBackend):
+            backend.save()
+
+
+atexit.register(_save_indexes)
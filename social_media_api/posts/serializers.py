@@ -1,6 +1,8 @@
 # social_media_api/posts/serializers.py
 
+from django.db import models
 from rest_framework import serializers
+from .likes import apply_pending_likes
 from .models import Post, Comment, Like
 
 class CommentSerializer(serializers.ModelSerializer):
@@ -11,19 +13,46 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'post', 'author', 'content', 'created_at', 'updated_at']
         read_only_fields = ['created_at', 'updated_at']
 
+class PostListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        posts = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        request = self.context.get('request')
+        if request is not None:
+            apply_pending_likes(request.user, posts)
+        return super().to_representation(posts)
+
 class PostSerializer(serializers.ModelSerializer):
     author = serializers.ReadOnlyField(source='author.username')
-    comments = CommentSerializer(many=True, read_only=True)
-    likes_count = serializers.SerializerMethodField()
+    comments = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
         fields = ['id', 'author', 'title', 'content', 'created_at', 
-                  'updated_at', 'comments', 'likes_count']
-        read_only_fields = ['created_at', 'updated_at']
-
-    def get_likes_count(self, obj):
-        return obj.likes.count()
+                  'updated_at', 'comments', 'likes_count', 'comments_count',
+                  'is_liked']
+        read_only_fields = ['created_at', 'updated_at', 'likes_count',
+                            'comments_count']
+        list_serializer_class = PostListSerializer
+
+    def to_representation(self, instance):
+        request = self.context.get('request')
+        if self.parent is None and request is not None:
+            apply_pending_likes(request.user, [instance])
+        return super().to_representation(instance)
+
+    def get_is_liked(self, obj):
+        # Annotated by Post.objects.with_like_state(); absent on freshly
+        # created posts, which nobody can have liked yet
+        return getattr(obj, 'is_liked', False)
+
+    def get_comments(self, obj):
+        # Only a bounded preview is embedded; the full thread is paginated at
+        # /api/posts/<id>/comments/. Prefetched by Post.objects.with_related().
+        comments = getattr(obj, 'latest_comments', None)
+        if comments is None:
+            comments = obj.comments.latest_preview()
+        return CommentSerializer(comments, many=True, context=self.context).data
 
 class LikeSerializer(serializers.ModelSerializer):
     user = serializers.ReadOnlyField(source='user.username')
@@ -0,0 +1,73 @@
+# social_media_api/posts/signals.py
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from .models import Comment, Like, Post, likes_changed
+from .response_cache import response_cache
+from .search import InvertedIndexBackend, get_search_backend
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if isinstance(backend, InvertedIndexBackend):
+        transaction.on_commit(lambda: backend.index(instance))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    backend = get_search_backend()
+    if isinstance(backend, InvertedIndexBackend):
+        post_id = instance.pk
+        transaction.on_commit(lambda: backend.remove(post_id))
+
+
+# Cached responses are invalidated after the search index is updated (the
+# receivers above run first), so fresh search pages never see a stale index
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post_responses(sender, instance, **kwargs):
+    # Counters are updated in place without saving, so a save is a new
+    # post or an edit of what lists show
+    response_cache.invalidate([instance.pk], lists=True)
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_commented_post_responses(sender, instance, **kwargs):
+    response_cache.invalidate([instance.post_id])
+
+
+# Likes get no post_delete receiver: it would stop Django from deleting the
+# likes of a deleted post or user with a single fast DELETE. The like and
+# unlike paths report their writes through likes_changed instead
+
+@receiver(post_save, sender=Like)
+def invalidate_liked_post_responses(sender, instance, **kwargs):
+    response_cache.invalidate([instance.post_id])
+
+
+@receiver(likes_changed, sender=Like)
+def invalidate_changed_likes_responses(sender, post_ids, **kwargs):
+    response_cache.invalidate(post_ids)
+
+
+@receiver(pre_save, sender=settings.AUTH_USER_MODEL)
+def remember_stored_username(sender, instance, update_fields=None, **kwargs):
+    # Posts embed author and commenter usernames and nothing else about
+    # users, so only a rename invalidates. Note the stored name before
+    # saves that may change it; new users have no posts yet
+    instance._stored_username = None
+    if instance._state.adding or (update_fields is not None
+                                  and 'username' not in update_fields):
+        return
+    instance._stored_username = (sender.objects.filter(pk=instance.pk)
+                                 .values_list('username', flat=True).first())
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_author_responses(sender, instance, created=False, **kwargs):
+    stored = getattr(instance, '_stored_username', None)
+    if not created and stored is not None and stored != instance.username:
+        response_cache.invalidate(everything=True)
@@ -1,3 +1,757 @@
-from django.test import TestCase
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+from io import StringIO
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.core.cache import cache
+from notifications.dispatch import dispatcher
+from notifications.models import Notification
+from .likes import LikeBuffer, like_buffer
+from . import search
+from .models import Post, Comment, Like, TimelineEntry
 
-# Create your tests here.
+User = get_user_model()
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class FeedTimelineTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.reader.follow(self.author)
+        self.author.refresh_from_db()
+        self.client.force_authenticate(user=self.author)
+
+    def test_create_post_fans_out_to_followers(self):
+        response = self.client.post(reverse('post-list'),
+                                    {'title': 'Hello', 'content': 'World'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post_id=response.data['id']).exists())
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([post['title'] for post in response.data['results']], ['Hello'])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_high_follower_author_is_pulled_at_read_time(self):
+        cache.clear()
+        self.client.post(reverse('post-list'), {'title': 'Viral', 'content': 'Post'})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([post['title'] for post in response.data['results']], ['Viral'])
+        self.assertTrue(TimelineEntry.objects.filter(user=self.reader).exists())
+
+        self.client.force_authenticate(user=self.author)
+        self.client.post(reverse('post-list'), {'title': 'Later', 'content': 'Post'})
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([post['title'] for post in response.data['results']],
+                         ['Later', 'Viral'])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_fan_out_rereads_a_stale_follower_count(self):
+        # A token-cached request.user may predate the author's followers
+        self.author.followers_count = 0
+        self.client.force_authenticate(user=self.author)
+        self.client.post(reverse('post-list'), {'title': 'Viral', 'content': 'Post'})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_unchanged_feed_pulls_nothing(self):
+        cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-list'), {'title': 'Viral', 'content': 'Post'})
+        self.client.force_authenticate(user=self.reader)
+        self.client.get(reverse('feed'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('feed'))
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith('INSERT')])
+
+        self.client.force_authenticate(user=self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-list'), {'title': 'Later', 'content': 'Post'})
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([post['title'] for post in response.data['results']],
+                         ['Later', 'Viral'])
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=1, FEED_BACKFILL_ASYNC=False)
+    def test_author_falling_to_threshold_is_backfilled(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        other.follow(self.author)
+        self.client.post(reverse('post-list'), {'title': 'Viral', 'content': 'Post'})
+        self.assertFalse(TimelineEntry.objects.exists())
+
+        # Nobody read their feed meanwhile; once the author is fanned out on
+        # write again, the earlier post must not vanish from the feed. The
+        # backfill runs after the unfollow commits
+        self.client.force_authenticate(user=other)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(reverse('unfollow-user', kwargs={'user_id': self.author.id}))
+        self.assertFalse(TimelineEntry.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(list(TimelineEntry.objects.values_list('user__username', flat=True)),
+                         ['reader'])
+
+    def test_follow_backfills_and_unfollow_clears_timeline(self):
+        other = User.objects.create_user(username='other', password='testpass123')
+        Post.objects.create(author=other, title='Earlier', content='Post')
+        self.client.force_authenticate(user=self.reader)
+
+        self.client.post(reverse('follow-user', kwargs={'user_id': other.id}))
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 1)
+
+        self.client.post(reverse('unfollow-user', kwargs={'user_id': other.id}))
+        self.assertFalse(TimelineEntry.objects.filter(user=self.reader).exists())
+
+    def test_trim_timelines_keeps_newest_entries(self):
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Post')
+                 for i in range(5)]
+        TimelineEntry.objects.bulk_create([
+            TimelineEntry(user=self.reader, post=post, created_at=post.created_at)
+            for post in posts])
+        call_command('trim_timelines', length=2, batch_size=1, stdout=StringIO())
+        self.assertEqual(sorted(TimelineEntry.objects.values_list('post_id', flat=True)),
+                         [posts[3].pk, posts[4].pk])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostCursorPaginationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        Post.objects.bulk_create([
+            Post(author=self.author, title=f'Post {i}', content='Content')
+            for i in range(25)
+        ])
+
+    def test_cursor_pages_walk_every_post_once(self):
+        seen = []
+        url = reverse('post-list')
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            seen.extend(post['id'] for post in response.data['results'])
+            url = response.data['next']
+        expected = list(Post.objects.order_by('-created_at', '-id')
+                        .values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+
+# Measures the database path, so anonymous responses are not cached
+@override_settings(SECURE_SSL_REDIRECT=False, POST_RESPONSE_CACHE_TTL=0)
+class PostQueryCountTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.authors = [
+            User.objects.create_user(username=f'author{i}', password='testpass123')
+            for i in range(3)
+        ]
+        for author in self.authors:
+            self.reader.follow(author)
+
+    def create_posts(self, count):
+        for i in range(count):
+            author = self.authors[i % len(self.authors)]
+            post = Post.objects.create(author=author, title=f'Post {i}', content='Content',
+                                       likes_count=3, comments_count=3)
+            TimelineEntry.objects.create(user=self.reader, post=post,
+                                         created_at=post.created_at)
+            for commenter in self.authors:
+                Comment.objects.create(post=post, author=commenter, content='Nice')
+                Like.objects.create(post=post, user=commenter)
+
+    def assert_constant_queries(self, url, expected):
+        for page_size in (2, 8):
+            Post.objects.all().delete()
+            self.create_posts(page_size)
+            with self.assertNumQueries(expected):
+                response = self.client.get(url)
+            self.assertEqual(len(response.data['results']), page_size)
+            self.assertEqual(response.data['results'][0]['likes_count'], 3)
+            self.assertEqual(len(response.data['results'][0]['comments']), 3)
+
+    def test_post_list_query_count_is_constant(self):
+        # Posts page + comments prefetch
+        self.assert_constant_queries(reverse('post-list'), 2)
+
+    def test_feed_query_count_is_constant(self):
+        self.client.force_authenticate(user=self.reader)
+        # Followee check + version probe + posts page + comments prefetch
+        self.assert_constant_queries(reverse('feed'), 4)
+
+    def test_is_liked_adds_no_queries(self):
+        self.client.force_authenticate(user=self.authors[0])
+        self.assert_constant_queries(reverse('post-list'), 2)
+        response = self.client.get(reverse('post-list'))
+        self.assertTrue(all(post['is_liked'] for post in response.data['results']))
+
+        self.client.force_authenticate(user=self.reader)
+        response = self.client.get(reverse('feed'))
+        self.assertFalse(any(post['is_liked'] for post in response.data['results']))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class PostCounterTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.post = Post.objects.create(author=self.user, title='Post', content='Content')
+        self.client.force_authenticate(user=self.user)
+
+    def test_like_and_unlike_maintain_likes_count(self):
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+
+        self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+
+    def test_like_and_unlike_responses(self):
+        like = reverse('post-like', kwargs={'pk': self.post.pk})
+        unlike = reverse('post-unlike', kwargs={'pk': self.post.pk})
+        self.assertEqual(self.client.post(like).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.client.post(like).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(unlike).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(unlike).status_code, status.HTTP_400_BAD_REQUEST)
+        missing = self.post.pk + 100
+        for name in ('post-like', 'post-unlike'):
+            response = self.client.post(reverse(name, kwargs={'pk': missing}))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(Like.objects.exists())
+
+    def test_unlike_is_a_single_delete(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        # savepoint, counter update, delete, release
+        with self.assertNumQueries(4):
+            self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+
+    def test_writes_lock_the_post_before_the_child_row(self):
+        # Taking the post row's shared (foreign key) lock before its
+        # exclusive (counter) lock deadlocks concurrent writers on InnoDB
+        def statements(method, url, data=None):
+            with CaptureQueriesContext(connection) as queries:
+                getattr(self.client, method)(url, data)
+            return [query['sql'].split()[0] for query in queries.captured_queries
+                    if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))]
+
+        like = reverse('post-like', kwargs={'pk': self.post.pk})
+        self.assertEqual(statements('post', like)[:2], ['UPDATE', 'INSERT'])
+        response = self.client.post(reverse('comment-list'),
+                                    {'post': self.post.pk, 'content': 'Nice'})
+        self.assertEqual(
+            statements('delete', reverse('comment-detail', kwargs={'pk': response.data['id']}))[:2],
+            ['UPDATE', 'DELETE'])
+
+    def test_decrements_stop_at_zero_on_drifted_counters(self):
+        Like.objects.create(user=self.user, post=self.post)
+        comment = Comment.objects.create(post=self.post, author=self.user, content='Nice')
+        response = self.client.post(reverse('post-unlike', kwargs={'pk': self.post.pk}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.delete(reverse('comment-detail', kwargs={'pk': comment.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (0, 0))
+
+    def test_comment_create_and_delete_maintain_comments_count(self):
+        response = self.client.post(reverse('comment-list'),
+                                    {'post': self.post.pk, 'content': 'Nice'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 1)
+
+        self.client.delete(reverse('comment-detail', kwargs={'pk': response.data['id']}))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comments_count, 0)
+
+    def test_reconcile_repairs_drifted_counters(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=2)
+        call_command('reconcile_post_counters', batch_size=1, stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.comments_count), (1, 0))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, POST_COMMENT_PREVIEW_SIZE=2)
+class CommentPreviewTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.post = Post.objects.create(author=self.user, title='Post', content='Content',
+                                        comments_count=15)
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.user, content=f'Comment {i}')
+            for i in range(15)
+        ])
+
+    def test_post_embeds_only_latest_comments(self):
+        response = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertEqual([c['content'] for c in response.data['comments']],
+                         ['Comment 14', 'Comment 13'])
+        self.assertEqual(response.data['comments_count'], 15)
+
+    def test_post_comments_endpoint_pages_through_thread(self):
+        url = reverse('post-comments', kwargs={'post_pk': self.post.pk})
+        seen = []
+        while url:
+            response = self.client.get(url)
+            seen.extend(c['content'] for c in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(seen, [f'Comment {i}' for i in range(15)])
+
+
+@override_settings(SECURE_SSL_REDIRECT=False,
+                   POST_SEARCH_BACKEND='posts.search.InvertedIndexBackend',
+                   POST_SEARCH_INDEX_ASYNC=False)
+class PostSearchTestCase(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.index_path = os.path.join(directory.name, 'index.json')
+        overrides = override_settings(POST_SEARCH_INDEX_PATH=self.index_path)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        search._backends.clear()
+        self.addCleanup(search._backends.clear)
+
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.tips = Post.objects.create(author=self.user, title='Django tips',
+                                        content='Django ORM and Django views')
+        self.cooking = Post.objects.create(author=self.user, title='Cooking',
+                                           content='Jollof rice')
+        self.mention = Post.objects.create(author=self.user, title='Weekend',
+                                           content='Went hiking, read about django')
+
+    def search(self, query):
+        response = self.client.get(reverse('post-list'), {'search': query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+
+    def test_results_are_ranked_by_relevance(self):
+        self.assertEqual(self.search('django'), ['Django tips', 'Weekend'])
+        self.assertEqual(self.search('jollof hiking'), ['Cooking', 'Weekend'])
+        self.assertEqual(self.search('nothing'), [])
+
+    def test_index_follows_post_changes(self):
+        self.search('django')  # load the index
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('post-list'), {'title': 'Django again',
+                                                    'content': 'Django'})
+            self.client.delete(reverse('post-detail', args=[self.tips.pk]))
+            self.client.patch(reverse('post-detail', args=[self.cooking.pk]),
+                              {'content': 'Django cooking'})
+        self.assertEqual(self.search('django'), ['Django again', 'Cooking', 'Weekend'])
+        self.assertEqual(self.search('jollof'), [])
+
+    def test_saved_index_is_reloaded_and_caught_up(self):
+        backend = search.get_search_backend()
+        backend.ensure_loaded()
+        backend.save()
+        self.assertTrue(os.path.exists(self.index_path))
+        # Written while no process has the index loaded
+        Post.objects.create(author=self.user, title='Late django post', content='')
+        Post.objects.filter(pk=self.mention.pk).delete()
+
+        search._backends.clear()
+        self.assertCountEqual(self.search('django'), ['Late django post', 'Django tips'])
+
+    def test_unreadable_index_file_is_rebuilt(self):
+        # e.g. a pickle planted at the path: never unpickled, just ignored
+        with open(self.index_path, 'wb') as handle:
+            handle.write(b'\x80\x04\x95not json')
+        with self.assertLogs('posts.search', 'ERROR'):
+            self.assertEqual(self.search('jollof'), ['Cooking'])
+
+    @override_settings(POST_SEARCH_INDEX_ASYNC=True)
+    def test_searches_match_in_the_database_until_the_index_loads(self):
+        backend = search.get_search_backend()
+        with mock.patch.object(backend, 'start_loading') as start_loading:
+            self.assertEqual(self.search('django'), ['Weekend', 'Django tips'])
+            self.assertEqual(self.search('django hiking'), ['Weekend'])
+        start_loading.assert_called()
+        self.assertFalse(backend.loaded)
+
+        backend.ensure_loaded()
+        self.assertEqual(self.search('django'), ['Django tips', 'Weekend'])
+
+    @override_settings(POST_SEARCH_INDEX_ASYNC=True, POST_SEARCH_INDEX_SAVE_INTERVAL=0)
+    def test_requests_leave_saving_to_the_worker(self):
+        search.get_search_backend().ensure_loaded()
+        with mock.patch.object(search.InvertedIndexBackend, 'save') as save:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('post-list'), {'title': 'Django again',
+                                                        'content': 'Django'})
+        save.assert_not_called()
+
+    def test_changes_made_while_loading_are_kept(self):
+        backend = search.get_search_backend()
+        staging = backend._read(saved=True)
+        # Committed after the load read the database
+        with self.captureOnCommitCallbacks(execute=True):
+            late = Post.objects.create(author=self.user, title='Late django post',
+                                       content='')
+            self.tips.delete()
+        backend._install(staging)
+        self.assertCountEqual(self.search('django'), ['Late django post', 'Weekend'])
+        self.assertIn(late.pk, backend.documents)
+
+    def test_mysql_backend_uses_match_against(self):
+        queryset = search.MySQLFullTextBackend().search(Post.objects.all(), 'django')
+        sql = str(queryset.query)
+        self.assertIn('MATCH ("posts_post"."title", "posts_post"."content") '
+                      'AGAINST (django IN NATURAL LANGUAGE MODE)', sql)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.reader = User.objects.create_user(username='reader', password='testpass123')
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.reader.follow(self.author)
+        self.post = Post.objects.create(author=self.author, title='Hello', content='World')
+        TimelineEntry.objects.create(user=self.reader, post=self.post,
+                                     created_at=self.post.created_at)
+        self.comment = Comment.objects.create(post=self.post, author=self.author,
+                                              content='First')
+        self.client.force_authenticate(user=self.reader)
+        self.detail_url = reverse('post-detail', kwargs={'pk': self.post.pk})
+
+    def assert_not_modified(self, url, etag, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_unchanged_post_is_not_modified(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assert_not_modified(self.detail_url, response['ETag'], 1)
+
+    def test_post_etag_follows_likes_and_comment_edits(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.post(reverse('post-like', kwargs={'pk': self.post.pk}))
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['is_liked'])
+
+        etag = response['ETag']
+        self.comment.content = 'Edited'
+        self.comment.save()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['comments'][0]['content'], 'Edited')
+
+    def test_post_etag_is_per_user(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        self.client.force_authenticate(user=self.author)
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_missing_post_is_not_found(self):
+        response = self.client.get(reverse('post-detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_unchanged_feed_is_not_modified(self):
+        url = reverse('feed')
+        etag = self.client.get(url)['ETag']
+        # Followee check + version probe
+        self.assert_not_modified(url, etag, 2)
+
+        post = Post.objects.create(author=self.author, title='Newer', content='Post')
+        TimelineEntry.objects.create(user=self.reader, post=post,
+                                     created_at=post.created_at)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False,
+                   POST_SEARCH_BACKEND='posts.search.InvertedIndexBackend',
+                   POST_SEARCH_INDEX_PATH=None, POST_SEARCH_INDEX_ASYNC=False)
+class ResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        search._backends.clear()
+        self.addCleanup(search._backends.clear)
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.post = Post.objects.create(author=self.user, title='Django', content='Tips')
+        self.other = Post.objects.create(author=self.user, title='Other', content='Post')
+        self.detail_url = reverse('post-detail', kwargs={'pk': self.post.pk})
+        self.other_url = reverse('post-detail', kwargs={'pk': self.other.pk})
+
+    def assert_cached(self, url, **extra):
+        self.client.get(url, **extra)
+        with self.assertNumQueries(0):
+            return self.client.get(url, **extra)
+
+    def as_user(self, method, url):
+        client = APIClient()
+        client.force_authenticate(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(client, method)(url, {'post': self.post.pk, 'content': 'Hi'})
+
+    def test_anonymous_list_detail_and_search_are_cached(self):
+        self.assertEqual(len(self.assert_cached(reverse('post-list')).data['results']), 2)
+        self.assertEqual(self.assert_cached(self.detail_url).data['title'], 'Django')
+        response = self.assert_cached(reverse('post-list'), data={'search': 'django'})
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post.pk])
+
+    def test_cached_detail_answers_conditional_get_without_queries(self):
+        etag = self.client.get(self.detail_url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_authenticated_requests_are_not_cached(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(self.detail_url)
+        with self.assertNumQueries(3):  # version probe, post, comments
+            self.client.get(self.detail_url)
+
+    def test_like_invalidates_only_its_post(self):
+        self.assert_cached(self.detail_url)
+        self.assert_cached(self.other_url)
+        self.assert_cached(reverse('post-list'))
+        self.as_user('post', reverse('post-like', kwargs={'pk': self.post.pk}))
+
+        self.assertEqual(self.client.get(self.detail_url).data['likes_count'], 1)
+        # List pages keep serving their counters until the TTL
+        with self.assertNumQueries(0):
+            self.client.get(self.other_url)
+            self.client.get(reverse('post-list'))
+
+    def test_post_edit_invalidates_lists(self):
+        self.assert_cached(reverse('post-list'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post.title = 'Edited'
+            self.post.save()
+        titles = [post['title'] for post in self.client.get(reverse('post-list')).data['results']]
+        self.assertIn('Edited', titles)
+
+    def test_comment_invalidates_its_post(self):
+        self.assert_cached(self.detail_url)
+        self.as_user('post', reverse('comment-list'))
+        response = self.client.get(self.detail_url)
+        self.assertEqual([c['content'] for c in response.data['comments']], ['Hi'])
+
+    def test_new_post_invalidates_search_results(self):
+        url = reverse('post-list')
+        self.assert_cached(url, data={'search': 'django'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.create(author=self.user, title='More Django', content='ORM')
+        response = self.client.get(url, {'search': 'django'})
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_profile_edit_invalidates_everything(self):
+        self.assert_cached(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = 'renamed'
+            self.user.save()
+        self.assertEqual(self.client.get(self.detail_url).data['author'], 'renamed')
+
+    def test_profile_edit_without_rename_keeps_cache(self):
+        self.assert_cached(self.detail_url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.bio = 'New bio'
+            self.user.save()
+        with self.assertNumQueries(0):
+            self.client.get(self.detail_url)
+
+
+@override_settings(SECURE_SSL_REDIRECT=False, LIKE_WRITE_BEHIND=True,
+                   LIKE_FLUSH_INTERVAL=0, NOTIFICATIONS_ASYNC=False)
+class WriteBehindLikeTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        like_buffer.flush()
+        self.client = APIClient()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.user = User.objects.create_user(username='user', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Viral', content='Post')
+        self.client.force_authenticate(user=self.user)
+        self.like_url = reverse('post-like', kwargs={'pk': self.post.pk})
+        self.unlike_url = reverse('post-unlike', kwargs={'pk': self.post.pk})
+
+    def test_likes_are_buffered_until_flushed(self):
+        self.assertEqual(self.client.post(self.like_url).status_code, status.HTTP_201_CREATED)
+        self.assertFalse(Like.objects.exists())
+        # The liking user reads their own write before it is flushed
+        self.assertEqual(self.client.post(self.like_url).status_code, status.HTTP_200_OK)
+
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertTrue(Like.objects.filter(user=self.user, post=self.post).exists())
+        self.assertEqual(Notification.objects.get(recipient=self.author).verb,
+                         'liked your post')
+
+    def test_is_liked_reflects_unflushed_likes(self):
+        self.client.post(self.like_url)
+        detail = self.client.get(reverse('post-detail', kwargs={'pk': self.post.pk}))
+        self.assertTrue(detail.data['is_liked'])
+        listing = self.client.get(reverse('post-list'))
+        self.assertTrue(listing.data['results'][0]['is_liked'])
+
+        self.client.post(self.unlike_url)
+        listing = self.client.get(reverse('post-list'))
+        self.assertFalse(listing.data['results'][0]['is_liked'])
+
+    def test_like_then_unlike_before_flush_writes_nothing(self):
+        self.client.post(self.like_url)
+        self.assertEqual(self.client.post(self.unlike_url).status_code, status.HTTP_200_OK)
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, Like.objects.count()), (0, 0))
+
+    def test_flush_batches_many_likes_into_few_statements(self):
+        fans = User.objects.bulk_create([User(username=f'fan{i}') for i in range(50)])
+        for fan in fans:
+            like_buffer.record(fan.pk, self.post.pk, True)
+        # post lookup, content type, post lock, existing likes, insert,
+        # counter update (+ savepoints), then one notification group
+        # insert-and-merge
+        with self.assertNumQueries(14):
+            like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 50)
+
+    def test_failed_flush_is_retried(self):
+        self.client.post(self.like_url)
+        with mock.patch.object(like_buffer, '_insert', side_effect=DatabaseError('down')), \
+                self.assertLogs('posts.likes', 'ERROR'):
+            like_buffer.flush()
+        self.assertFalse(Like.objects.exists())
+        # Still read back as liked, and written by the next flush
+        self.assertEqual(like_buffer.pending_states(self.user.pk, [self.post.pk]),
+                         {self.post.pk: True})
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, Like.objects.count()), (1, 1))
+
+    def test_concurrent_taps_change_the_state_once(self):
+        pending_states = like_buffer.pending_states
+
+        def slow_pending_states(user_id, post_ids):
+            time.sleep(0.02)
+            return pending_states(user_id, post_ids)
+
+        # A marker to read, so the threads need no database
+        like_buffer.record(self.user.pk, self.post.pk, False)
+        results = []
+        with mock.patch.object(like_buffer, 'pending_states', side_effect=slow_pending_states):
+            threads = [threading.Thread(target=lambda: results.append(
+                like_buffer.change(self.user.pk, self.post.pk, True))) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(sorted(results), [False] * 4 + [True])
+
+    def test_taps_flushed_out_of_order_keep_the_last_one(self):
+        # Like recorded by one process, then unlike by another whose buffer
+        # flushes first; the older like must not be written afterwards
+        self.client.post(self.like_url)
+        other_process = LikeBuffer()
+        with mock.patch('posts.views.like_buffer', other_process):
+            self.assertEqual(self.client.post(self.unlike_url).status_code,
+                             status.HTTP_200_OK)
+        other_process.flush()
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, Like.objects.count()), (0, 0))
+
+    def test_repeat_taps_cost_no_queries(self):
+        self.client.post(self.like_url)
+        with self.assertNumQueries(0):
+            response = like_buffer.change(self.user.pk, self.post.pk, True)
+        self.assertIs(response, False)
+
+    def test_buffered_unlike_removes_stored_like(self):
+        self.client.post(self.like_url)
+        like_buffer.flush()
+        self.assertEqual(self.client.post(self.unlike_url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.post(self.unlike_url).status_code,
+                         status.HTTP_400_BAD_REQUEST)
+        like_buffer.flush()
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, Like.objects.count()), (0, 0))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class ConcurrentLikeTestCase(TransactionTestCase):
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            # Shared-cache in-memory SQLite raises instead of waiting for locks
+            self.skipTest('needs a database that serializes concurrent writers')
+
+    def hammer(self, action, users, repeats=4):
+        """Send `repeats` concurrent requests per user and return the status codes."""
+        url = reverse(action, kwargs={'pk': self.post.pk})
+        codes, errors = [], []
+        start = threading.Barrier(len(users) * repeats)
+
+        def tap(user):
+            client = APIClient()
+            client.force_authenticate(user=user)
+            try:
+                start.wait()
+                codes.append(client.post(url).status_code)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=tap, args=(user,))
+                   for user in users for _ in range(repeats)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # Let queued like notifications finish before the test database is flushed
+        dispatcher.flush(timeout=5)
+        self.assertEqual(errors, [])
+        return codes
+
+    def test_concurrent_double_taps(self):
+        author = User.objects.create_user(username='author', password='testpass123')
+        self.post = Post.objects.create(author=author, title='Hot', content='Post')
+        users = [User.objects.create_user(username=f'fan{i}', password='testpass123')
+                 for i in range(8)]
+
+        codes = self.hammer('post-like', users)
+        self.assertEqual(codes.count(status.HTTP_201_CREATED), len(users))
+        self.assertEqual(codes.count(status.HTTP_200_OK), len(users) * 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, len(users))
+        self.assertEqual(Like.objects.filter(post=self.post).count(), len(users))
+
+        codes = self.hammer('post-unlike', users)
+        self.assertEqual(codes.count(status.HTTP_200_OK), len(users))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(Like.objects.exists())
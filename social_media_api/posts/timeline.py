@@ -0,0 +1,272 @@
+# social_media_api/posts/timeline.py
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from .models import Post, TimelineEntry
+
+logger = logging.getLogger(__name__)
+
+FANOUT_BATCH_SIZE = 1000
+
+# Overlap between pulls of high-follower authors' posts, covering posts that
+# committed after a later-created post had already been pulled
+PULL_OVERLAP = timedelta(minutes=1)
+
+
+def is_fanout_on_read(author):
+    """
+    Authors with more followers than FEED_FANOUT_MAX_FOLLOWERS are not
+    fanned out on write; their posts are pulled into feeds at read time.
+    """
+    # Re-read the count: `author` may be a token-cached request.user
+    followers_count = (get_user_model().objects.filter(pk=author.pk)
+                       .values_list('followers_count', flat=True).first())
+    return (followers_count or 0) > settings.FEED_FANOUT_MAX_FOLLOWERS
+
+
+def _insert_entries(entries):
+    TimelineEntry.objects.bulk_create(entries, batch_size=FANOUT_BATCH_SIZE,
+                                      ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """
+    Write `post` into the materialized timeline of every follower of its
+    author. Returns the number of followers reached (0 for authors served
+    by fan-out-on-read).
+    """
+    if is_fanout_on_read(post.author):
+        # Tell feed reads that this author has something new to pull. The
+        # commit time is recorded: a pull that started earlier may not have
+        # seen the post, however long before it was created
+        transaction.on_commit(lambda: cache.set(
+            _posted_key(post.author_id), timezone.now(), None))
+        return 0
+
+    follower_ids = post.author.followers.values_list('id', flat=True)
+    entries = []
+    delivered = 0
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        entries.append(TimelineEntry(user_id=follower_id, post=post,
+                                     created_at=post.created_at))
+        if len(entries) >= FANOUT_BATCH_SIZE:
+            _insert_entries(entries)
+            delivered += len(entries)
+            entries = []
+    if entries:
+        _insert_entries(entries)
+        delivered += len(entries)
+    return delivered
+
+
+def _recent_posts(author_ids):
+    """The FEED_BACKFILL_POSTS newest posts of each author, as (id, created_at)."""
+    return (Post.objects.filter(author_id__in=author_ids)
+            .annotate(rank=Window(RowNumber(), partition_by=F('author_id'),
+                                  order_by=F('created_at').desc()))
+            .filter(rank__lte=settings.FEED_BACKFILL_POSTS)
+            .values_list('id', 'created_at'))
+
+
+def backfill_timeline(user, *authors):
+    """
+    Copy the most recent posts of newly followed authors into `user`'s
+    timeline so the feed is not empty until they post again. Any number of
+    authors is handled with a single windowed query.
+    """
+    if not authors:
+        return
+    _insert_entries([
+        TimelineEntry(user=user, post_id=post_id, created_at=created_at)
+        for post_id, created_at in _recent_posts([author.pk for author in authors])
+    ])
+
+
+def backfill_followers(author_id):
+    """
+    Copy the recent posts of `author_id` into the timeline of each of their
+    followers, in batches of FANOUT_BATCH_SIZE. Needed once an author falls
+    back to FEED_FANOUT_MAX_FOLLOWERS: posts written above the threshold
+    were only pulled into the feeds that were read meanwhile, and are no
+    longer pulled from now on. Returns the number of entries written.
+    """
+    User = get_user_model()
+    if not User.objects.filter(pk=author_id, followers_count__lte=(
+            settings.FEED_FANOUT_MAX_FOLLOWERS)).exists():
+        return 0  # back above the threshold; its posts are pulled again
+    posts = list(_recent_posts([author_id]))
+    if not posts:
+        return 0
+    follower_ids = (User.following.through.objects.filter(followee_id=author_id)
+                    .values_list('follower_id', flat=True))
+    entries = []
+    written = 0
+    for follower_id in follower_ids.iterator(chunk_size=FANOUT_BATCH_SIZE):
+        entries.extend(TimelineEntry(user_id=follower_id, post_id=post_id,
+                                     created_at=created_at)
+                       for post_id, created_at in posts)
+        if len(entries) >= FANOUT_BATCH_SIZE:
+            _insert_entries(entries)
+            written += len(entries)
+            entries = []
+    _insert_entries(entries)
+    return written + len(entries)
+
+
+class FollowerBackfiller:
+    """
+    Runs backfill_followers() for authors that fell back to the fan-out
+    threshold on a daemon worker thread, so the unfollow that tipped them
+    over does not write up to FEED_FANOUT_MAX_FOLLOWERS * FEED_BACKFILL_POSTS
+    entries inside its own request. With FEED_BACKFILL_ASYNC disabled (e.g.
+    in tests) authors are backfilled inline. A backfill lost to a restart
+    is repaired by `python manage.py rebuild_timelines`.
+    """
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def enqueue(self, author_ids):
+        if not settings.FEED_BACKFILL_ASYNC:
+            for author_id in author_ids:
+                backfill_followers(author_id)
+            return
+        self._ensure_worker()
+        for author_id in author_ids:
+            self.queue.put(author_id)
+
+    def flush(self, timeout=None):
+        """Wait until every queued author has been backfilled (or `timeout`)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.unfinished_tasks and self._worker and self._worker.is_alive():
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            time.sleep(0.01)
+
+    def _ensure_worker(self):
+        # Started lazily so each forked server process gets its own worker
+        if self._worker and self._worker.is_alive():
+            return
+        with self._lock:
+            if not (self._worker and self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, daemon=True,
+                                                name='timeline-backfiller')
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            author_id = self.queue.get()
+            try:
+                close_old_connections()
+                backfill_followers(author_id)
+            except Exception:
+                logger.exception('Failed to backfill the followers of %s', author_id)
+            finally:
+                close_old_connections()
+                self.queue.task_done()
+
+
+follower_backfiller = FollowerBackfiller()
+atexit.register(follower_backfiller.flush, timeout=5)
+
+
+def schedule_follower_backfill(*authors):
+    """
+    After an unfollow, queue backfill_followers() for those of `authors`
+    that are now back at FEED_FANOUT_MAX_FOLLOWERS, once the current
+    transaction commits.
+    """
+    crossed = list(get_user_model().objects.filter(
+        pk__in=[author.pk for author in authors],
+        followers_count=settings.FEED_FANOUT_MAX_FOLLOWERS).values_list('pk', flat=True))
+    if crossed:
+        transaction.on_commit(lambda: follower_backfiller.enqueue(crossed))
+
+
+def remove_from_timeline(user, *authors):
+    """Drop every post of `authors` from `user`'s timeline after an unfollow."""
+    TimelineEntry.objects.filter(user=user, post__author__in=authors).delete()
+
+
+def _pull_key(user):
+    return f'feed:pulled:{user.pk}'
+
+
+def _posted_key(author_id):
+    return f'feed:posted:{author_id}'
+
+
+def pull_fanout_on_read_posts(user, author_ids):
+    """
+    Copy posts of the high-follower authors `user` follows into their
+    timeline: those published since the previous pull, or each author's
+    FEED_BACKFILL_POSTS newest when the cache no longer remembers it.
+    Authors whose last post committed (see fan_out_post) before the
+    previous pull are skipped, so reading an unchanged feed writes nothing.
+    """
+    pulled_at = timezone.now()
+    posted_keys = {_posted_key(author_id): author_id for author_id in author_ids}
+    found = cache.get_many([_pull_key(user), *posted_keys])
+    since = found.get(_pull_key(user))
+    if since is None:
+        posts = _recent_posts(author_ids)
+    else:
+        # An evicted watermark means the author may have posted
+        author_ids = [author_id for key, author_id in posted_keys.items()
+                      if found.get(key, since) >= since]
+        if not author_ids:
+            return
+        posts = (Post.objects.filter(author_id__in=author_ids,
+                                     created_at__gte=since - PULL_OVERLAP)
+                 .values_list('id', 'created_at'))
+    _insert_entries([
+        TimelineEntry(user=user, post_id=post_id, created_at=created_at)
+        for post_id, created_at in posts
+    ])
+    cache.set(_pull_key(user), pulled_at, None)
+
+
+def trim_timeline(user_id, length):
+    """Delete all but the `length` newest entries of a timeline; returns the count."""
+    entries = TimelineEntry.objects.filter(user_id=user_id)
+    boundary = (entries.order_by('-created_at', '-post_id')
+                .values_list('created_at', 'post_id')[length:length + 1])
+    if not boundary:
+        return 0
+    created_at, post_id = boundary[0]
+    deleted, _ = entries.filter(Q(created_at__lt=created_at) |
+                                Q(created_at=created_at, post_id__lte=post_id)).delete()
+    return deleted
+
+
+def feed_queryset(user):
+    """
+    Posts in `user`'s home feed, all read from their timeline entries.
+    Posts of high-follower authors the user follows are pulled into the
+    timeline first. The entry's own (created_at, post) is annotated as
+    feed_created_at/feed_post_id, so ordering on them is a single range scan
+    of timeline_user_created_post_idx.
+    """
+    fanout_on_read_ids = list(
+        user.following
+        .filter(followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS)
+        .values_list('id', flat=True)
+    )
+    if fanout_on_read_ids:
+        pull_fanout_on_read_posts(user, fanout_on_read_ids)
+    return (Post.objects.filter(timeline_entries__user=user)
+            .annotate(feed_created_at=F('timeline_entries__created_at'),
+                      feed_post_id=F('timeline_entries__post')))
@@ -3,6 +3,7 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (PostViewSet, CommentViewSet, FeedView)
+from .pagination import CommentCursorPagination
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet)
@@ -15,4 +16,8 @@ urlpatterns = [
          name='post-like'),
     path('posts/<int:pk>/unlike/', PostViewSet.as_view({'post': 'unlike'}), 
          name='post-unlike'),
+    path('posts/<int:post_pk>/comments/',
+         CommentViewSet.as_view({'get': 'list'},
+                                pagination_class=CommentCursorPagination),
+         name='post-comments'),
 ]
\ No newline at end of file
@@ -1,14 +1,24 @@
 # social_media_api/posts/views.py
 
+from functools import partial
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.decorators import action
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
 from rest_framework.response import Response
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from .models import Post, Comment, Like
 from .serializers import PostSerializer, CommentSerializer, LikeSerializer
-from notifications.models import Notification
+from .timeline import fan_out_post, feed_queryset
+from .likes import like_buffer
+from .response_cache import response_cache
+from .pagination import FeedCursorPagination, PostCursorPagination, PostSearchPagination
+from .filters import PostSearchFilter
+from notifications.dispatch import notify
+from social_media_api.conditional import conditional_get, make_etag
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters
 from .models import Post
 from rest_framework.permissions import IsAuthenticated
 
@@ -17,59 +27,195 @@ class IsAuthorOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
         return obj.author == request.user
+
+
+def versions_etag(user, versions, *extra):
+    """ETag for the posts described by Post.objects.versions() rows."""
+    pending = {}
+    if settings.LIKE_WRITE_BEHIND and user.is_authenticated:
+        pending = like_buffer.pending_states(user.pk, [row['id'] for row in versions])
+    return make_etag(user.pk, settings.POST_COMMENT_PREVIEW_SIZE, *extra,
+                     [(tuple(row.values()), pending.get(row['id'])) for row in versions])
     
 # Post View CRUD Operations
 class PostViewSet(viewsets.ModelViewSet):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    pagination_class = PostCursorPagination
+    filter_backends = [DjangoFilterBackend, PostSearchFilter]
     filterset_fields = ['title']
     search_fields = ['title', 'content']
 
+    def get_queryset(self):
+        return (super().get_queryset().with_related()
+                .with_like_state(self.request.user))
+
+    @property
+    def paginator(self):
+        # Relevance-ordered search results cannot be keyset paginated
+        if (not hasattr(self, '_paginator')
+                and self.request.query_params.get(PostSearchFilter.search_param)):
+            self._paginator = PostSearchPagination()
+        return super().paginator
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            post = serializer.save(author=self.request.user)
+            fan_out_post(post)
+
+    def _post_id(self):
+        try:
+            return int(self.kwargs['pk'])
+        except (TypeError, ValueError):
+            raise Http404
+
+    def list(self, request, *args, **kwargs):
+        # Anonymous post list and search pages are served from the cache
+        return response_cache.respond(
+            request, partial(super().list, request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        post_id = self._post_id()
+        return response_cache.respond(
+            request, partial(self._conditional_retrieve, request, post_id, *args, **kwargs),
+            post_id=post_id)
+
+    def _conditional_retrieve(self, request, post_id, *args, **kwargs):
+        # Probe the post's versions first; an unchanged post is answered
+        # with 304 without loading comments or running the serializer
+        versions = list(Post.objects.filter(pk=post_id).versions(request.user))
+        if not versions:
+            raise Http404
+        return conditional_get(request, versions_etag(request.user, versions),
+                               partial(super().retrieve, request, *args, **kwargs))
+
+    def _buffered_like(self, post_id, liked):
+        # Write-behind mode: record the change and let the flusher write it
+        changed = like_buffer.change(self.request.user.pk, post_id, liked)
+        if changed is None:
+            raise Http404
+        return changed
 
     @action(detail=True, methods=['POST'])
     def like(self, request, pk=None):
-        post = generics.get_object_or_404(Post, pk=pk)
-        _, created = Like.objects.get_or_create(user=request.user, post=post)
+        post_id = self._post_id()
+        if settings.LIKE_WRITE_BEHIND:
+            if self._buffered_like(post_id, liked=True):
+                return Response({'status': 'post liked'}, status=status.HTTP_201_CREATED)
+            return Response({'status': 'post already liked'}, status=status.HTTP_200_OK)
+        # The counter is updated first so the post row's exclusive lock is
+        # taken before the insert's shared (foreign key) lock; the other
+        # order deadlocks concurrent likes of one post on InnoDB. The
+        # affected-row counts decide everything: no read before the writes
+        # and no IntegrityError on concurrent double-taps
+        with transaction.atomic():
+            found = Post.objects.filter(pk=post_id).update(
+                likes_count=F('likes_count') + 1)
+            created = bool(found) and Like.objects.add(request.user, post_id)
+            if created:
+                post = Post.objects.select_related('author').get(pk=post_id)
+                notify(post.author, request.user, 'liked your post', post)
+            else:
+                # Already liked (or no such post): undo the increment
+                transaction.set_rollback(True)
+        if not found:
+            raise Http404
         if created:
-            Notification.objects.create(
-                recipient=post.author,
-                actor=request.user,
-                verb='liked your post',
-                target=post
-            )
             return Response({'status': 'post liked'}, status=status.HTTP_201_CREATED)
         return Response({'status': 'post already liked'}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['POST'])
     def unlike(self, request, pk=None):
-        post = generics.get_object_or_404(Post, pk=pk)
-        like = Like.objects.filter(user=request.user, post=post).first()
-        if like:
-            like.delete()
+        post_id = self._post_id()
+        if settings.LIKE_WRITE_BEHIND:
+            if self._buffered_like(post_id, liked=False):
+                return Response({'status': 'post unliked'}, status=status.HTTP_200_OK)
+            return Response({'status': 'post not liked'}, status=status.HTTP_400_BAD_REQUEST)
+        # Post row first, as in like()
+        with transaction.atomic():
+            found = Post.objects.filter(pk=post_id).decrement_counter('likes_count')
+            deleted = bool(found) and Like.objects.remove(request.user, post_id)
+            if not deleted:
+                transaction.set_rollback(True)
+        if not found:
+            raise Http404
+        if deleted:
             return Response({'status': 'post unliked'}, status=status.HTTP_200_OK)
         return Response({'status': 'post not liked'}, status=status.HTTP_400_BAD_REQUEST)
 
 # Comment View CRUD Operations
 class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Nested /posts/<post_pk>/comments/ listing of a single post's thread
+        post_pk = self.kwargs.get('post_pk')
+        if post_pk is not None:
+            queryset = queryset.filter(post_id=post_pk)
+        return queryset
+
+    # Each write updates the post's counter before touching the comment, so
+    # the post row's exclusive lock is taken before the comment insert's
+    # shared (foreign key) lock; see PostViewSet.like()
+
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        with transaction.atomic():
+            Post.objects.filter(pk=serializer.validated_data['post'].pk).update(
+                comments_count=F('comments_count') + 1)
+            comment = serializer.save(author=self.request.user)
+            notify(comment.post.author, self.request.user,
+                   'commented on your post', comment.post)
+
+    def perform_update(self, serializer):
+        previous_post_id = serializer.instance.post_id
+        post = serializer.validated_data.get('post')
+        with transaction.atomic():
+            if post is not None and post.pk != previous_post_id:
+                # post_save only reports the post the comment moved to
+                response_cache.invalidate([previous_post_id])
+                # Both posts locked in pk order, so opposite moves cannot deadlock
+                for post_id in sorted([previous_post_id, post.pk]):
+                    if post_id == previous_post_id:
+                        Post.objects.filter(pk=post_id).decrement_counter('comments_count')
+                    else:
+                        Post.objects.filter(pk=post_id).update(
+                            comments_count=F('comments_count') + 1)
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            Post.objects.filter(pk=instance.post_id).decrement_counter('comments_count')
+            instance.delete()
 
 # Feed View
 class FeedView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedCursorPagination
+
+    def timeline(self):
+        # Read the materialized timeline, ordered by its entries' creation
+        # date (newest first)
+        if not hasattr(self, '_timeline'):
+            self._timeline = (feed_queryset(self.request.user)
+                              .order_by('-feed_created_at', '-feed_post_id'))
+        return self._timeline
 
     def get_queryset(self):
-        user = self.request.user
-        # Fetch all users the current user is following
-        following_users = user.following.all()
-        # Return posts authored by followed users, ordered by creation date (newest first)
-        return Post.objects.filter(author__in=following_users).order_by('-created_at')
\ No newline at end of file
+        return self.timeline().with_related().with_like_state(self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        # Page through the versions with a paginator of our own, so the
+        # probe reads exactly the posts (and cursors) the response would
+        probe = self.pagination_class()
+        versions = probe.paginate_queryset(
+            self.timeline().versions(request.user, 'feed_created_at', 'feed_post_id'),
+            request, view=self)
+        etag = versions_etag(request.user, versions,
+                             probe.get_next_link(), probe.get_previous_link())
+        return conditional_get(request, etag,
+                               partial(super().list, request, *args, **kwargs))
\ No newline at end of file
@@ -0,0 +1,29 @@
+# social_media_api/social_media_api/conditional.py
+
+import hashlib
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(*versions):
+    """
+    Strong ETag for a representation whose content is fully determined by
+    `versions` (updated_at timestamps, counters and the like).
+    """
+    digest = hashlib.sha1(repr(versions).encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def conditional_get(request, etag, render):
+    """
+    Answer a GET with 304 Not Modified when If-None-Match already holds
+    `etag`, otherwise call `render()` to build the full response. Either
+    way the response carries the ETag and varies on the credentials, since
+    these representations are per user.
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = render()
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Authorization'])
+    return response
@@ -0,0 +1,73 @@
+# social_media_api/social_media_api/counters.py
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Case, Count, F, Value, When
+
+
+def decremented(field, amount=1):
+    """
+    Update expression subtracting `amount` from a denormalized counter,
+    stopping at 0. Counters can drift below the true count (buffered likes,
+    cascading deletes), and a plain F() subtraction would then fail the
+    CHECK constraint (or the unsigned column on MySQL) instead of leaving
+    the repair to the reconcile commands. Case/When rather than Greatest,
+    since MySQL rejects the out-of-range subtraction before clamping.
+    """
+    return Case(When(**{f'{field}__gte': amount}, then=F(field) - amount),
+                default=Value(0))
+
+
+def recount(model, counters, ids):
+    """
+    Recompute the denormalized counters of the `model` rows `ids` and
+    repair those that drifted. `counters` maps each counter field to the
+    (child model, foreign key) whose rows it counts. The rows are locked
+    while they are recounted, so concurrent F() updates wait for the
+    repair. Returns the number of rows repaired.
+    """
+    with transaction.atomic():
+        rows = list(model.objects.select_for_update().filter(pk__in=ids)
+                    .order_by('pk').values_list('pk', *counters))
+        totals = {
+            field: dict(child.objects.filter(**{f'{key}__in': ids})
+                        .values(key).annotate(total=Count('pk'))
+                        .values_list(key, 'total'))
+            for field, (child, key) in counters.items()
+        }
+        drifted = []
+        for pk, *stored in rows:
+            actual = {field: totals[field].get(pk, 0) for field in counters}
+            if list(actual.values()) != stored:
+                drifted.append(model(pk=pk, **actual))
+        model.objects.bulk_update(drifted, list(counters))
+    return len(drifted)
+
+
+class ReconcileCountersCommand(BaseCommand):
+    """
+    Base for commands that recount a model's denormalized counters (see
+    recount()) one batch of rows at a time. Subclasses set `model`,
+    `counters` and `noun`.
+    """
+
+    model = None
+    counters = {}
+    noun = 'rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help=f'Number of {self.noun} checked per transaction.')
+
+    def handle(self, *args, **options):
+        last_id, checked, repaired = 0, 0, 0
+        while True:
+            ids = list(self.model.objects.filter(pk__gt=last_id).order_by('pk')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            repaired += recount(self.model, self.counters, ids)
+            checked += 1
+            last_id = ids[-1]
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} batches, repaired {repaired} {self.noun}.'))
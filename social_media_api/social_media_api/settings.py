@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import os
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -101,6 +103,23 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+
+# Per-process local memory by default (development and tests). Production
+# runs several processes, which must share token lookups, throttle counters,
+# pending likes and cached responses: point CACHE_BACKEND at a shared
+# backend, e.g. django.core.cache.backends.redis.RedisCache with
+# CACHE_LOCATION=redis://127.0.0.1:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND',
+                                  'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'social-media-api'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -154,7 +173,7 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.ExpiringTokenAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -162,8 +181,155 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    # Requests arrive through the Heroku router, which appends the address
+    # it saw to X-Forwarded-For; only that last entry can be trusted, so
+    # throttles (e.g. login per IP) cannot be dodged by forging the header
+    'NUM_PROXIES': 1,
 }
 
+# Feed Settings
+
+# Authors with more followers than this are not fanned out on write; their
+# posts are pulled into followers' timelines when the feed is read instead.
+FEED_FANOUT_MAX_FOLLOWERS = 5000
+
+# Entries kept per timeline by `python manage.py trim_timelines`
+FEED_TIMELINE_MAX_ENTRIES = 800
+
+# Number of recent posts copied into a timeline when following an author
+FEED_BACKFILL_POSTS = 50
+
+# Copy an author's recent posts into all their followers' timelines (when
+# they fall back to FEED_FANOUT_MAX_FOLLOWERS) from a background worker
+# thread instead of the unfollow request
+FEED_BACKFILL_ASYNC = True
+
+# Number of "who to follow" suggestions stored and returned per user
+FOLLOW_SUGGESTIONS_TOP_K = 20
+
+# Number of latest comments embedded in each serialized post
+POST_COMMENT_PREVIEW_SIZE = 3
+
+# Like Write-Behind
+
+# Buffer likes in memory and write them in batches from a background thread
+# instead of one insert and counter update per request (for viral posts)
+LIKE_WRITE_BEHIND = False
+
+# Seconds between flushes (0 disables the background flusher) and likes
+# written per bulk insert
+LIKE_FLUSH_INTERVAL = 1.0
+LIKE_FLUSH_BATCH_SIZE = 5000
+
+# Seconds a user's unflushed like/unlike is remembered in the shared cache so
+# they read their own writes from any process
+LIKE_PENDING_TTL = 300
+
+# Post Search
+
+# Dotted path of the post search backend; None picks MySQL full-text search
+# on MySQL and the in-process inverted index on any other database
+POST_SEARCH_BACKEND = None
+
+# Most results the inverted index ranks for one query
+POST_SEARCH_MAX_RESULTS = 1000
+
+# JSON file the inverted index is persisted to (None keeps it in memory and
+# rebuilds it from the database in each process) and how often, in seconds,
+# pending changes are written back. Use a directory only the app can write
+POST_SEARCH_INDEX_PATH = None
+POST_SEARCH_INDEX_SAVE_INTERVAL = 60
+
+# Load and save the inverted index on a background thread, matching posts in
+# the database until it is loaded; with POST_SEARCH_INDEX_ASYNC = False the
+# first search loads it inline
+POST_SEARCH_INDEX_ASYNC = True
+
+# Post Response Cache
+
+# Seconds rendered anonymous post list, detail and search responses are
+# cached (0 disables). Writes invalidate them at once; the TTL only bounds
+# how long entries for changes made outside the ORM signals may linger
+POST_RESPONSE_CACHE_TTL = 300
+
+# Notification Settings
+
+# Write notifications from background worker threads instead of the request
+NOTIFICATIONS_ASYNC = True
+
+NOTIFICATION_WORKERS = 1
+
+# Maximum number of notifications written per bulk insert
+NOTIFICATION_BATCH_SIZE = 500
+
+# Seconds a worker waits for more events before writing a partial batch
+NOTIFICATION_FLUSH_INTERVAL = 0.5
+
+# Times a worker tries to write a batch (e.g. after a deadlock with another
+# writer) before giving up on it
+NOTIFICATION_WRITE_ATTEMPTS = 3
+
+# Number of most recent actors kept on a grouped notification
+NOTIFICATION_LATEST_ACTORS = 3
+
+# Seconds a cached unread-notification count may be served
+NOTIFICATION_UNREAD_COUNT_TTL = 300
+
+# Read notifications older than this many days are moved to the archive by
+# `python manage.py archive_notifications`
+NOTIFICATION_RETENTION_DAYS = 90
+
+# Token Expiry
+
+# Tokens expire after this long without use; the expiry slides forward at
+# most once per AUTH_TOKEN_REFRESH_INTERVAL to avoid a write per request
+AUTH_TOKEN_TTL = timedelta(days=14)
+AUTH_TOKEN_REFRESH_INTERVAL = timedelta(days=1)
+
+# Token Authentication Cache
+
+# Seconds a token -> user lookup is kept in the shared cache
+TOKEN_AUTH_CACHE_TTL = 300
+
+# Seconds (and entries) kept in each process's local LRU; this bounds how
+# long another process may still accept a token after it is invalidated
+TOKEN_AUTH_LOCAL_TTL = 30
+TOKEN_AUTH_LOCAL_MAXSIZE = 10000
+
+# Login Throttling
+
+# Login attempts allowed per client IP and per username ('<count>/<period>',
+# period one of s, m, h, d), counted over a sliding window in the cache
+LOGIN_THROTTLE_IP_RATE = '30/min'
+LOGIN_THROTTLE_USERNAME_RATE = '10/min'
+
+# Threads per process that verify login passwords; 0 hashes inline. With a
+# pool, at most LOGIN_HASH_WORKERS + LOGIN_HASH_QUEUE_SIZE logins wait for a
+# hash at once and further attempts get 503, so a credential-stuffing burst
+# cannot tie up every request thread on password hashing. With a pool,
+# logins are checked like ModelBackend (AUTHENTICATION_BACKENDS is bypassed;
+# user_login_failed is still sent)
+LOGIN_HASH_WORKERS = 0
+LOGIN_HASH_QUEUE_SIZE = 8
+
+# Profile Pictures
+
+# Square thumbnails generated for every profile picture (name -> pixels)
+PROFILE_PICTURE_SIZES = {'small': 64, 'medium': 256, 'large': 512}
+
+# Longest side of the stored (metadata-stripped) main image
+PROFILE_PICTURE_MAX_DIMENSION = 1024
+PROFILE_PICTURE_QUALITY = 85
+
+# Uploads over these limits are rejected before any decoding
+PROFILE_PICTURE_MAX_UPLOAD_SIZE = 5 * 1024 * 1024
+PROFILE_PICTURE_MAX_PIXELS = 40_000_000
+
+# Uploads are written here and resized on a background worker thread;
+# with PROFILE_PICTURES_ASYNC = False they are processed inline
+PROFILE_PICTURES_ASYNC = True
+PROFILE_PICTURE_STAGING_DIR = os.path.join(tempfile.gettempdir(), 'profile_pic_uploads')
+
 # Media Files
 
 MEDIA_URL = '/media/'